@@ -0,0 +1,40 @@
+TAKEOFF_QUEUE = 0
+DEPARTURE = 1
+ARRIVAL = 2
+APPROACHING = 3
+
+
+# A single aircraft parsed from its progress strip and radar label
+# Strip fields depend on the state:
+#   TAKEOFF_QUEUE - runway and destination
+#   DEPARTURE     - destination
+#   ARRIVAL       - assigned heading (or the fix it is routed to, kept in destination)
+#   APPROACHING   - runway
+# Radar fields (x, y, alt, speed) stay None until the label has been parsed
+# Speed is in knots
+class Aircraft:
+    __slots__ = ('callsign', 'state', 'runway', 'destination', 'heading', 'x', 'y', 'alt', 'speed')
+
+    def __init__(self, callsign, state, runway=None, destination=None, heading=None):
+        self.callsign = callsign
+        self.state = state
+        self.runway = runway
+        self.destination = destination
+        self.heading = heading
+        self.x = None
+        self.y = None
+        self.alt = None
+        self.speed = None
+
+    @property
+    def tracked(self):
+        return self.x is not None
+
+    @property
+    def pos(self):
+        return (self.x, self.y)
+
+    def __repr__(self):
+        return 'Aircraft({}, state={}, runway={}, destination={}, heading={}, x={}, y={}, alt={}, speed={})'.format(
+            self.callsign, self.state, self.runway, self.destination, self.heading,
+            self.x, self.y, self.alt, self.speed)
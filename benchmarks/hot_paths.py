@@ -0,0 +1,185 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+import simulator
+from controller import Controller
+
+# Times the parser and decision hot paths against synthetic traffic of increasing size
+# Each stage is timed on its own and reported as per-call latency percentiles, along with how its cost
+# grows with the number of aircraft. Results are written as JSON so runs from different commits can be
+# compared with --compare
+# Run from the repository root with: python -m benchmarks.hot_paths
+
+AIRCRAFT_COUNTS = [10, 50, 200, 1000]
+PERCENTILES = [50, 90, 99]
+TICK_BUDGET_MS = 2000.0
+REGRESSION_RATIO = 1.2
+
+
+# Build a game with count aircraft spread over the radar and return its strips and canvas html
+def synthetic_traffic(count, seed=0):
+    sim = simulator.Simulator(seed=seed)
+    sim.populate(count)
+    return sim, sim.render_strips(), sim.render_canvas()
+
+
+# Call run() until min_samples samples or max_time seconds have been taken, and return milliseconds per call
+# setup() runs untimed before every sample, and each sample is divided by the calls it made
+def sample(run, setup=lambda: None, calls=1, min_samples=50, max_samples=1000, max_time=2.0):
+    times = []
+    deadline = time.perf_counter() + max_time
+    while len(times) < max_samples and (len(times) < min_samples or time.perf_counter() < deadline):
+        setup()
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) / calls * 1000)
+    return times
+
+
+def summarise(times):
+    times = np.array(times)
+    summary = {'p{}'.format(p): float(np.percentile(times, p)) for p in PERCENTILES}
+    summary['mean'] = float(times.mean())
+    summary['max'] = float(times.max())
+    summary['samples'] = len(times)
+    return summary
+
+
+# Time every stage at one traffic level
+def bench_count(count, max_time):
+    sim, strips_html, canvas_html = synthetic_traffic(count)
+
+    # The same page is parsed over and over, so the incremental parser would only ever hit its cache
+    # benchmarks.strip_parser times it on consecutive ticks instead
+    controller = Controller(incremental=False)
+    controller.set_landing_runway(sim.wind_dir)
+    controller.parse_waypts(canvas_html)
+
+    results = {}
+    results['parse_waypts'] = sample(lambda: controller.parse_waypts(canvas_html), max_time=max_time)
+    results['parse_plane_strips'] = sample(lambda: controller.parse_plane_strips(strips_html), max_time=max_time)
+    results['parse_canvas'] = sample(lambda: controller.parse_canvas(canvas_html), max_time=max_time)
+
+    # The page is parsed again before every call so each decision starts from the same traffic
+    def reparse():
+        controller.parse_plane_strips(strips_html)
+        controller.parse_canvas(canvas_html)
+
+    results['get_command_list'] = sample(lambda: controller.get_command_list(time.perf_counter()), setup=reparse,
+                                         max_time=max_time)
+    return {name: summarise(times) for name, times in results.items()}
+
+
+# Growth exponent k between successive counts, where cost ~ count ** k
+def scaling(results, counts):
+    curves = {}
+    for name in results[str(counts[0])]:
+        curve = []
+        for low, high in zip(counts, counts[1:]):
+            ratio = results[str(high)][name]['p50'] / max(results[str(low)][name]['p50'], 1e-9)
+            curve.append({'from': low, 'to': high, 'exponent': math.log(ratio) / math.log(high / low)})
+        curves[name] = curve
+    return curves
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(counts, max_time):
+    results = {}
+    for count in counts:
+        results[str(count)] = bench_count(count, max_time)
+
+    return {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'counts': counts,
+        'tick_budget_ms': TICK_BUDGET_MS,
+        'results': results,
+        'scaling': scaling(results, counts) if len(counts) > 1 else {},
+    }
+
+
+def print_report(report):
+    names = list(report['results'][str(report['counts'][0])])
+    print('{:>24} {:>8} {:>10} {:>10} {:>10}'.format('stage', 'aircraft', 'p50 ms', 'p90 ms', 'p99 ms'))
+    for name in names:
+        for count in report['counts']:
+            summary = report['results'][str(count)][name]
+            print('{:>24} {:>8} {:>10.4f} {:>10.4f} {:>10.4f}'.format(
+                name, count, summary['p50'], summary['p90'], summary['p99']))
+
+    print()
+    print('Growth exponents (1 = linear, 2 = quadratic)')
+    for name, curve in report['scaling'].items():
+        print('{:>24} '.format(name) + ' '.join(
+            '{}->{}: {:.2f}'.format(step['from'], step['to'], step['exponent']) for step in curve))
+
+    print()
+    print('Share of the {:.0f} ms tick at p99'.format(report['tick_budget_ms']))
+    for count in report['counts']:
+        # Waypoints are parsed once per session
+        total = sum(report['results'][str(count)][name]['p99'] for name in names if name != 'parse_waypts')
+        print('{:>8} aircraft: {:8.3f} ms ({:.2f}%){}'.format(
+            count, total, total / report['tick_budget_ms'] * 100,
+            '  OVER BUDGET' if total > report['tick_budget_ms'] else ''))
+
+
+# Print the p50 ratio of every stage against an earlier run, flagging slowdowns over REGRESSION_RATIO
+def compare(report, baseline):
+    print()
+    print('Against {} (p50 ratio, above 1 is slower)'.format(baseline['commit']))
+    regressions = 0
+    for count, stages in report['results'].items():
+        for name, summary in stages.items():
+            if count not in baseline['results'] or name not in baseline['results'][count]:
+                continue
+            ratio = summary['p50'] / max(baseline['results'][count][name]['p50'], 1e-9)
+            flag = ''
+            if ratio > REGRESSION_RATIO:
+                flag = '  REGRESSION'
+                regressions += 1
+            print('{:>24} {:>8} {:>8.2f}{}'.format(name, count, ratio, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the parser and decision hot paths')
+    parser.add_argument('--counts', type=int, nargs='+', default=AIRCRAFT_COUNTS)
+    parser.add_argument('--max-time', type=float, default=2.0, help='seconds to spend sampling each stage')
+    parser.add_argument('--output', default=None,
+                        help='JSON file to write, default benchmarks/results/hot_paths-<commit>.json')
+    parser.add_argument('--compare', default=None, help='earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    report = run(args.counts, args.max_time)
+    print_report(report)
+
+    output = args.output
+    if output is None:
+        output = os.path.join(os.path.dirname(__file__), 'results', 'hot_paths-{}.json'.format(report['commit']))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print()
+    print('Results written to', output)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            raise SystemExit(1)
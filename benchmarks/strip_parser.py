@@ -0,0 +1,64 @@
+import re
+import timeit
+
+import controller
+import simulator
+from fragments import FragmentCache
+from profiles import load_airport
+
+# Compares the single-pass strip parser against the original four regex scans, and against the incremental
+# parser on consecutive ticks, where only the strips that changed since the last tick are parsed
+# Run from the repository root with: python -m benchmarks.strip_parser
+
+STRIP_COUNTS = [20, 200, 2000]
+APPROACH_EXPRESSION = load_airport(controller.AIRPORT).approach_expression
+
+LEGACY_EXPRESSIONS = [
+    r'<div id="(.+?)" name="\1".+? rgb\(192, 228, 250\);">\1 &nbsp;(\d{1,2}[LR]).+?To: (.{3,6})<',
+    r'<div id="(.+?)" name="\1".+? rgb\(192, 228, 250\);">\1 &nbsp;(\D.+?) ',
+    r'<div id="(.+?)" name="\1".+? rgb\(252, 240, 198\);">\1 &nbsp;(\w[A-Z]{2,5}|\d{2,3}°)',
+    r'<div id="(.+?)" name="\1".+? rgb\(252, 240, 198\);">\1 &nbsp;((?:9|27)[LR])',
+]
+
+
+def legacy_tokenize_strips(html):
+    return [re.findall(expression, html) for expression in LEGACY_EXPRESSIONS]
+
+
+# Time a function and return the best per-strip cost in microseconds
+def per_strip_cost(function, html, count, repeat=5):
+    number = max(1, 20000 // count)
+    best = min(timeit.repeat(lambda: function(html), number=number, repeat=repeat))
+    return best / number / count * 1e6
+
+
+# Per-strip cost of the incremental parser when every call parses the tick after the one before it
+def incremental_cost(pages, count, repeat=5):
+    cache = FragmentCache('<div id="', lambda fragment: controller.read_strip_fragment(fragment, APPROACH_EXPRESSION))
+    number = max(2, 20000 // count)
+
+    def run():
+        for k in range(number):
+            controller.tokenize_changed_strips(pages[k % 2], cache)
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / number / count * 1e6
+
+
+if __name__ == '__main__':
+    print('{:>8} {:>16} {:>16} {:>8} {:>9} {:>18} {:>8}'.format(
+        'strips', 'legacy us/strip', 'single us/strip', 'speedup', 'changed', 'incremental us/strip', 'speedup'))
+    for count in STRIP_COUNTS:
+        sim = simulator.Simulator(seed=count)
+        sim.populate(count)
+        html = sim.render_strips()
+        # The next tick's strips
+        sim.step(2.0)
+        next_html = sim.render_strips()
+        changed = len(set(next_html.split('<div id="')) - set(html.split('<div id="'))) / count
+
+        legacy = per_strip_cost(legacy_tokenize_strips, html, count)
+        single = per_strip_cost(lambda html: controller.tokenize_strips(html, APPROACH_EXPRESSION), html, count)
+        incremental = incremental_cost([html, next_html], count)
+        print('{:>8} {:>16.2f} {:>16.2f} {:>7.1f}x {:>8.0f}% {:>20.2f} {:>7.1f}x'.format(
+            count, legacy, single, legacy / single, changed * 100, incremental, single / incremental))
@@ -0,0 +1,142 @@
+import json
+
+# In-page helpers that let the bot talk to atc-sim.com in as few WebDriver round trips as possible
+# Nothing here touches the bot's state, controller.py turns the returned records into Aircraft
+
+# Defines collectRows(approachPattern), which reads every progress strip and radar label on the page
+# The strip expressions mirror the ones in controller.py so both paths classify strips identically, with
+# approachPattern the airport's Airport.approach_pattern
+# It returns [callsign, state, runway, destination, heading, left, top, alt, speed] rows,
+# with the radar fields null for planes that have no label yet
+COLLECT_ROWS_SCRIPT = r'''
+function stripsElement() {
+    var frame = document.getElementById('ProgressStrips') || document.getElementsByName('ProgressStrips')[0];
+    return frame.contentDocument.getElementById('strips');
+}
+
+function collectRows(approachPattern) {
+    var STRIP = /<div id="([^"]+)" name="\1".+? rgb\((192, 228, 250|252, 240, 198)\);">\1 &nbsp;/g;
+    var TAKEOFF_QUEUE = /(\d{1,2}[LR]).+?To: (.{3,6})</y;
+    var DEPARTURE = /(\D.+?) /y;
+    var ARRIVAL = /(\w[A-Z]{2,5}|\d{2,3}°)/y;
+    var APPROACH = new RegExp(approachPattern, 'y');
+    var LABEL = /<br>(\d{3}).(\d{2})/;
+
+    function matchAt(expression, html, pos) {
+        expression.lastIndex = pos;
+        return expression.exec(html);
+    }
+
+    var html = stripsElement().innerHTML;
+    var canvas = document.getElementById('canvas');
+
+    var rows = [];
+    var index = {};
+    var strip, match, row;
+    while ((strip = STRIP.exec(html)) !== null) {
+        var callsign = strip[1];
+        var pos = STRIP.lastIndex;
+        row = null;
+
+        if (strip[2] === '192, 228, 250') {
+            if ((match = matchAt(TAKEOFF_QUEUE, html, pos))) {
+                row = [callsign, 0, match[1], match[2], null];
+            } else if ((match = matchAt(DEPARTURE, html, pos))) {
+                row = [callsign, 1, null, match[1], null];
+            }
+        } else {
+            if ((match = matchAt(APPROACH, html, pos))) {
+                row = [callsign, 3, match[1], null, null];
+            } else if ((match = matchAt(ARRIVAL, html, pos))) {
+                var assigned = match[1];
+                if (assigned.charAt(assigned.length - 1) === '°') {
+                    row = [callsign, 2, null, null, parseInt(assigned, 10)];
+                } else {
+                    row = [callsign, 2, null, assigned, null];
+                }
+            }
+        }
+
+        if (row !== null) {
+            row.push(null, null, null, null);
+            index[callsign] = row;
+            rows.push(row);
+        }
+    }
+
+    var labels = canvas.querySelectorAll('div.SanSerif12');
+    for (var i = 0; i < labels.length; i++) {
+        var label = labels[i];
+        row = index[label.id];
+        match = LABEL.exec(label.innerHTML);
+        if (row === undefined || match === null) {
+            continue;
+        }
+
+        row[5] = parseInt(label.style.left, 10);
+        row[6] = parseInt(label.style.top, 10);
+        row[7] = parseInt(match[1], 10);
+        row[8] = parseInt(match[2], 10);
+    }
+
+    return rows;
+}
+'''
+
+# Collects every progress strip and radar label in a single execute_script call
+# Returns the rows from collectRows() as a JSON string
+# arguments[0] is the text for the takeoff / landing counter, or null to leave it alone, and arguments[1] the
+# airport's approach pattern
+SNAPSHOT_SCRIPT = COLLECT_ROWS_SCRIPT + r'''
+if (arguments[0] !== null) {
+    document.evaluate('/html/body/div[1]/div/div[6]', document, null,
+                      XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue.innerText = arguments[0];
+}
+
+return JSON.stringify(collectRows(arguments[1]));
+'''
+
+
+# Scrape the strips and radar labels, and optionally update the counter display, in one round trip
+# approach_pattern is the airport's Airport.approach_pattern
+def take_snapshot(driver, approach_pattern, counter_text=None):
+    return json.loads(driver.execute_script(SNAPSHOT_SCRIPT, counter_text, approach_pattern))
+
+
+# Submits a list of commands through the command box in a single execute_script call
+# Each command is entered by firing the form's submit event, then Enter key events if the page did
+# not pick it up. The page clears the box once it has read a command, which is how acceptance is detected
+# Returns a list with None for every accepted command and an error message for the rest
+DISPATCH_SCRIPT = r'''
+var commands = arguments[0];
+var input = document.evaluate('//*[@id="canvas"]/div[1]/div/form/input[1]', document, null,
+                              XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+var results = [];
+
+for (var i = 0; i < commands.length; i++) {
+    var command = commands[i];
+    try {
+        input.value = command;
+        if (input.form) {
+            input.form.dispatchEvent(new Event('submit', {bubbles: true, cancelable: true}));
+        }
+        if (input.value === command) {
+            var init = {key: 'Enter', code: 'Enter', keyCode: 13, which: 13, bubbles: true, cancelable: true};
+            input.dispatchEvent(new KeyboardEvent('keydown', init));
+            input.dispatchEvent(new KeyboardEvent('keypress', init));
+            input.dispatchEvent(new KeyboardEvent('keyup', init));
+        }
+        results.push(input.value === command ? 'not accepted by the page' : null);
+    } catch (e) {
+        results.push(String(e));
+    }
+}
+
+input.value = '';
+return results;
+'''
+
+
+# Enter every command in one round trip, see DISPATCH_SCRIPT
+def dispatch_commands(driver, commands):
+    return driver.execute_script(DISPATCH_SCRIPT, list(commands))
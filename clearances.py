@@ -0,0 +1,93 @@
+# Remembers the last clearance issued to each aircraft so commands that only repeat it are not sent again
+# A command is split into its clearances:
+#   lateral  - a heading ('C 090') or a fix to route to ('C BNN')
+#   altitude - an altitude in thousands of feet, with or without expedite ('C 4', 'C 2 EX')
+#   speed    - 'S 240'
+#   runway   - landing clearance 'L 27R'
+# Commands with an action ('A' go-around, 'T' takeoff) are always sent
+# Entries older than max_age seconds are forgotten so that clearances the game dropped get re-issued
+# Ages are measured on the clock the pages were read on, so how often ticks run does not change how often
+# clearances are refreshed
+
+MAX_ALTITUDE = 40
+
+
+# Split a command into its callsign, clearances and whether it contains an action
+def parse_command(command):
+    tokens = command.split()
+    clearances = {}
+    action = False
+
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token == 'C' and i + 1 < len(tokens):
+            value = tokens[i + 1]
+            i += 2
+            if not value.isdigit():
+                clearances['lateral'] = ('direct', value)
+            elif len(value) == 3 or int(value) > MAX_ALTITUDE:
+                clearances['lateral'] = ('heading', int(value) % 360)
+            else:
+                expedite = i < len(tokens) and tokens[i] == 'EX'
+                if expedite:
+                    i += 1
+                clearances['altitude'] = (int(value), expedite)
+        elif token == 'S' and i + 1 < len(tokens):
+            clearances['speed'] = tokens[i + 1]
+            i += 2
+        elif token == 'L' and i + 1 < len(tokens):
+            clearances['runway'] = tokens[i + 1]
+            i += 2
+        else:
+            # Actions and anything unrecognised are never filtered
+            action = True
+            i += 1
+
+    return tokens[0] if tokens else '', clearances, action
+
+
+class ClearanceLedger:
+    def __init__(self, max_age=20.0):
+        self.max_age = max_age
+        # callsign -> {clearance: (value, time issued)}
+        self.clearances = {}
+
+    def clear(self):
+        self.clearances = {}
+
+    # Forget aircraft that are no longer in play and clearances that are due a refresh
+    def expire(self, callsigns, now):
+        for callsign in list(self.clearances):
+            if callsign not in callsigns:
+                self.clearances.pop(callsign)
+                continue
+
+            issued = self.clearances[callsign]
+            for name in [name for name, (_, issued_at) in issued.items() if now - issued_at >= self.max_age]:
+                issued.pop(name)
+
+    # Drop commands whose clearances all match what the aircraft was last told
+    # callsigns is the set of aircraft currently in play and now the time the page was read, in seconds
+    def filter(self, commands, callsigns, now):
+        self.expire(callsigns, now)
+
+        filtered = []
+        for command in commands:
+            callsign, clearances, action = parse_command(command)
+            issued = self.clearances.setdefault(callsign, {})
+
+            if not action and clearances and all(
+                    name in issued and issued[name][0] == value for name, value in clearances.items()):
+                continue
+
+            # A go-around cancels the landing clearance
+            if 'A' in command.split():
+                issued.pop('runway', None)
+
+            for name, value in clearances.items():
+                if name not in issued or issued[name][0] != value:
+                    issued[name] = (value, now)
+            filtered.append(command)
+
+        return filtered
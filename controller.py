@@ -0,0 +1,593 @@
+import re
+import time
+
+import numpy as np
+
+from aircraft import Aircraft, TAKEOFF_QUEUE, DEPARTURE, ARRIVAL, APPROACHING
+from clearances import ClearanceLedger
+from fragments import FragmentCache
+from geometry import calculate_heading, calculate_sqr_distance, calculate_distance
+from lifecycle import AircraftStore, STATE_CHANGE, HANDOFF, LANDING, GO_AROUND
+from metrics import Metrics
+from params import Params
+from profiles import load_airport
+from separation import SeparationEngine
+from sequencing import ArrivalManager, DepartureScheduler
+from tracks import TrackHistory
+
+# The bot's decision making, kept apart from the browser so it can run against the simulator or a recording
+# All of a game's state lives on a Controller, so several games can be played side by side or one after
+# another in the same process
+
+# The airport profile played unless another is given, see profiles.py
+AIRPORT = 'EGLL'
+# Stretched target points are kept this far inside the edges of the radar
+STRETCH_MARGIN = 50
+
+
+# Strips are tokenized once each and classified by their colour and the text after the callsign
+# Departure strips (blue) are either waiting to takeoff (runway shown) or climbing (destination shown)
+# Arrival strips (yellow) are either being vectored (heading shown) or on approach (runway shown)
+# The runways shown on approach depend on the airport, so the expression for them comes from its profile
+DEPARTURE_COLOUR = '192, 228, 250'
+ARRIVAL_COLOUR = '252, 240, 198'
+STRIP_EXPRESSION = re.compile(
+    r'<div id="([^"]+)" name="\1".+? rgb\(({}|{})\);">\1 &nbsp;'.format(DEPARTURE_COLOUR, ARRIVAL_COLOUR))
+TAKEOFF_QUEUE_EXPRESSION = re.compile(r'(\d{1,2}[LR]).+?To: (.{3,6})<')
+DEPARTURE_EXPRESSION = re.compile(r'(\D.+?) ')
+ARRIVAL_EXPRESSION = re.compile(r'(\w[A-Z]{2,5}|\d{2,3}°)')
+
+
+# Read the strip that strip, a STRIP_EXPRESSION match, found in html
+# approach_expression is the airport's Airport.approach_expression
+# Returns (callsign, state, runway, destination, heading) for its Aircraft, or None if the text after the
+# callsign is not recognised
+def read_strip(html, strip, approach_expression):
+    callsign = strip.group(1)
+    pos = strip.end()
+
+    if strip.group(2) == DEPARTURE_COLOUR:
+        match = TAKEOFF_QUEUE_EXPRESSION.match(html, pos)
+        if match:
+            return callsign, TAKEOFF_QUEUE, match.group(1), match.group(2), None
+
+        match = DEPARTURE_EXPRESSION.match(html, pos)
+        if match:
+            return callsign, DEPARTURE, None, match.group(1), None
+    else:
+        match = approach_expression.match(html, pos)
+        if match:
+            return callsign, APPROACHING, match.group(1), None, None
+
+        match = ARRIVAL_EXPRESSION.match(html, pos)
+        if match:
+            assigned = match.group(1)
+            if assigned.endswith('°'):
+                return callsign, ARRIVAL, None, None, int(assigned[:-1])
+            return callsign, ARRIVAL, None, assigned, None
+
+    return None
+
+
+# Split the strips into the four plane_states categories in a single pass over the html
+def tokenize_strips(html, approach_expression):
+    categories = [[], [], [], []]
+
+    for strip in STRIP_EXPRESSION.finditer(html):
+        fields = read_strip(html, strip, approach_expression)
+        if fields is not None:
+            categories[fields[1]].append(Aircraft(*fields))
+
+    return categories
+
+
+# Read a single strip, as split off by a FragmentCache
+def read_strip_fragment(fragment, approach_expression):
+    strip = STRIP_EXPRESSION.match(fragment)
+    if strip is None:
+        return None
+    return read_strip(fragment, strip, approach_expression)
+
+
+# The same categories as tokenize_strips, only parsing the strips that changed since the last call
+def tokenize_changed_strips(html, cache):
+    categories = [[], [], [], []]
+    for fields in cache.parse(html):
+        categories[fields[1]].append(Aircraft(*fields))
+    return categories
+
+
+# Radar labels give each plane's page position, altitude in hundreds of feet and speed in tens of knots
+LABEL_EXPRESSION = re.compile(
+    r'<div id="(.+?)" class="SanSerif12".+?left: (.+?)px; top: (.+?)px.*\1<br>(\d{3}).(\d{2})')
+
+
+# Returns (callsign, left, top, alt, speed) for a LABEL_EXPRESSION match
+# left and top are page px, the airport profile turns them into a radar position
+def read_label(match):
+    return (match.group(1),
+            int(match.group(2)),            # left
+            int(match.group(3)),            # top
+            int(match.group(4)) * 100,      # alt
+            int(match.group(5)) * 10)       # spd
+
+
+# Read a single radar label, as split off by a FragmentCache
+def read_label_fragment(fragment):
+    match = LABEL_EXPRESSION.match(fragment)
+    if match is None:
+        return None
+    return read_label(match)
+
+
+# params holds the control constants, see params.py
+# With incremental set, strips and radar labels are only parsed again when their html changed, see fragments.py
+# airport is the compiled profile of the airport being played, see profiles.py
+class Controller:
+    def __init__(self, params=None, incremental=True, airport=None):
+        self.airport = airport or load_airport(AIRPORT)
+
+        # Every aircraft in play, by state and by callsign, see lifecycle.py
+        self.aircraft = AircraftStore()
+        self.aircraft.subscribe(STATE_CHANGE, self.on_state_change)
+        for kind in (HANDOFF, LANDING, GO_AROUND):
+            self.aircraft.subscribe(kind, self.count_event)
+
+        # Per-aircraft state, forgotten as soon as the aircraft leaves the game
+        # Departures cleared for takeoff that are still on the ground
+        self.taking_off = self.aircraft.attach(set())
+        # Planes told to speed up that have not reached full speed
+        self.speeding_up = self.aircraft.attach(set())
+        # Arrivals turning onto the localiser -> the runway they were cleared to land on
+        self.intercepting = self.aircraft.attach({})
+        # Arrivals -> index of the target point they are heading for, or -1 after a go-around
+        self.arrival_states = self.aircraft.attach({})
+        # Where each aircraft has been over the last few ticks, see tracks.py
+        self.tracks = self.aircraft.attach(TrackHistory())
+
+        self.clearance_ledger = ClearanceLedger()
+        self.arrival_manager = ArrivalManager()
+        self.departure_scheduler = DepartureScheduler()
+        self.metrics = Metrics()
+        self.handoffs = 0
+        self.landings = 0
+
+        # Position of Waypoints
+        self.waypts = {}
+        self.landing_rwy = ''
+        # The Direction of the airport landed in, see profiles.py
+        self.approach = None
+
+        self.strip_cache = None
+        self.label_cache = None
+        if incremental:
+            approach_expression = self.airport.approach_expression
+            self.strip_cache = FragmentCache('<div id="',
+                                             lambda fragment: read_strip_fragment(fragment, approach_expression))
+            self.label_cache = FragmentCache('<div id="', read_label_fragment)
+
+        self.set_params(params or Params())
+
+    # Play with another set of control constants from the next tick on
+    def set_params(self, params):
+        self.params = params
+        self.arrival_manager.landing_interval = params.landing_interval
+        self.arrival_manager.swap_margin = params.swap_margin
+        self.arrival_manager.max_stretch = params.max_stretch
+        self.arrival_manager.min_speed = params.min_speed
+        self.departure_scheduler.takeoff_occupancy = params.takeoff_occupancy
+        self.departure_scheduler.landing_buffer = params.landing_buffer
+
+    # Parse the data shown on the 'strips' on the right side of the screen
+    def parse_plane_strips(self, html):
+        if self.strip_cache is not None:
+            self.update_plane_states(tokenize_changed_strips(html, self.strip_cache))
+        else:
+            self.update_plane_states(tokenize_strips(html, self.airport.approach_expression))
+
+    # Replace the aircraft in play with freshly parsed strips
+    def update_plane_states(self, categories):
+        self.aircraft.update(categories)
+
+    # Plane States is an array that stores the state of each plane in play
+    # It has a list of sub-arrays corresponding to each possible state
+    # 0 - planes waiting to takeoff
+    # 1 - planes departing
+    # 2 - planes being guided to their final approach
+    # 3 - planes on final approach
+    # Each index will contain an Aircraft record for each plane in that state
+    @property
+    def plane_states(self):
+        return self.aircraft.states
+
+    # The same records by callsign
+    @property
+    def aircraft_table(self):
+        return self.aircraft.table
+
+    def on_state_change(self, event):
+        if event.new_state == DEPARTURE:
+            self.taking_off.discard(event.callsign)
+        elif event.new_state == APPROACHING:
+            self.arrival_states.pop(event.callsign, None)
+            self.intercepting.pop(event.callsign, None)
+
+    def count_event(self, event):
+        if event.kind == HANDOFF:
+            self.handoffs += 1
+        elif event.kind == LANDING:
+            self.landings += 1
+        self.metrics.count(event.kind + 's')
+
+    # Parse the data shown on the radar screen
+    def parse_canvas(self, html):
+        if self.label_cache is not None:
+            labels = self.label_cache.parse(html)
+        else:
+            labels = [read_label(match) for match in LABEL_EXPRESSION.finditer(html)]
+
+        to_radar = self.airport.to_radar
+        for callsign, left, top, alt, speed in labels:
+            plane = self.aircraft_table.get(callsign)
+            if plane is None:
+                continue
+
+            plane.x, plane.y = to_radar(left, top)
+            plane.alt = alt
+            plane.speed = speed
+
+    # Load the aircraft records collected by browser.take_snapshot
+    # Each row is [callsign, state, runway, destination, heading, left, top, alt, speed], radar fields may be None
+    def parse_snapshot(self, rows):
+        categories = [[], [], [], []]
+        to_radar = self.airport.to_radar
+        for callsign, state, runway, destination, heading, left, top, alt, speed in rows:
+            plane = Aircraft(callsign, state, runway=runway, destination=destination, heading=heading)
+            if left is not None:
+                plane.x, plane.y = to_radar(left, top)
+                plane.alt = alt * 100       # alt
+                plane.speed = speed * 10    # spd
+            categories[state].append(plane)
+
+        self.update_plane_states(categories)
+
+    def parse_waypts(self, html):
+        parse_expression = r'<img src="draw_.+\.php\?ID=(.+?)&amp;TYPE=[01]" style="position: absolute; left: (-?\d+)px; top: (-?\d+)px'
+        for match in re.findall(parse_expression, html):
+            self.waypts[match[0]] = self.airport.to_radar(int(match[1]), int(match[2]))
+
+    # How the plane is expected to move over the next few ticks, as its track in degrees and its ground
+    # velocity in px per second, either of which is None when unknown
+    # A plane flying the heading it was given, or the heading to the fix it has been routed to, or seen turning
+    # onto it, is projected along that heading at its radar speed, which runs ahead of the measurements
+    # through a turn. Measured motion is used for planes that have been given neither, such as arrivals on
+    # approach, and for planes that are seen flying some other way than they were told to
+    def plane_motion(self, plane):
+        commanded = plane.heading
+        if commanded is None and plane.destination in self.waypts:
+            commanded = calculate_heading(plane.pos, self.waypts[plane.destination])
+
+        measured = self.tracks.measured_track(plane.callsign)
+        if commanded is not None and (
+                measured is None or abs((commanded - measured + 540) % 360 - 180) <= self.params.heading_tolerance
+                or self.tracks.turning_towards(plane.callsign, commanded)):
+            return commanded, None
+        return measured, self.tracks.velocity(plane.callsign)
+
+    # Whether an arrival will pass within capture distance of a target point in the next capture_horizon
+    # seconds, if it keeps flying the way it has been seen to
+    def capturing(self, plane, target_point):
+        velocity = self.tracks.velocity(plane.callsign)
+        if velocity is None or not self.params.capture_horizon:
+            return False
+
+        # Closest approach to the point along the measured track, as in separation.closest_approach
+        vx, vy = velocity
+        speed = vx * vx + vy * vy
+        if not speed:
+            return False
+        dx = target_point[0] - plane.x
+        dy = target_point[1] - plane.y
+        t = min(max((dx * vx + dy * vy) / speed, 0), self.params.capture_horizon)
+        return calculate_sqr_distance((vx * t, vy * t), (dx, dy)) < self.params.capture_sqr_distance
+
+    # Pick the landing runway direction that best faces into the wind
+    def set_landing_runway(self, wind_dir):
+        self.landing_rwy = self.airport.landing_direction(wind_dir)
+        self.approach = self.airport.directions[self.landing_rwy]
+        self.arrival_manager.runways = list(self.approach.runways)
+
+    # The Route an arrival is vectored along, the one on its side of the airport, see profiles.py
+    def arrival_route(self, plane):
+        if plane.y < self.airport.position[1]:
+            return self.approach.south
+        return self.approach.north
+
+    # Distance in px an arrival still has to fly to the runway threshold along its target points
+    # Planes sent around fly back to the go-around fix and are sequenced again from the first northern target
+    # point
+    def distance_to_threshold(self, plane):
+        airport = self.airport
+        if plane.state == APPROACHING or plane.callsign in self.intercepting:
+            distance = airport.threshold_distance(plane.pos)
+            if distance is None:
+                distance = max(calculate_distance(plane.pos, airport.position) - airport.runway_half_length, 0)
+            return distance
+
+        route = self.arrival_route(plane)
+        state = self.arrival_states.get(plane.callsign, 0)
+        if state < 0:
+            route = self.approach.north
+            fix = self.waypts[airport.go_around_fix]
+            distance = calculate_distance(plane.pos, fix) + calculate_distance(fix, route.target_points[0]) \
+                + route.remaining[0]
+        else:
+            distance = calculate_distance(plane.pos, route.target_points[state]) + route.remaining[state]
+        return max(distance - airport.runway_half_length, 0)
+
+    # Give every arrival a runway and landing slot, see sequencing.py
+    def plan_arrivals(self):
+        arrivals = []
+        for plane in self.plane_states[ARRIVAL] + self.plane_states[APPROACHING]:
+            if not plane.tracked:
+                continue
+
+            # Planes still being vectored are timed at the speed they fly when nothing holds them back,
+            # so slowing one down to meet its slot does not move the slot
+            runway = plane.runway if plane.state == APPROACHING else self.intercepting.get(plane.callsign)
+            speed = plane.speed if runway is not None else self.params.max_speed
+            arrivals.append((plane.callsign, self.distance_to_threshold(plane), speed, runway,
+                             self.arrival_route(plane).runway))
+
+        return self.arrival_manager.plan(arrivals)
+
+    # How soon the next tick is needed, for the TickScheduler
+    # 0 with no traffic, 0.5 with traffic that is well separated, rising to 1 as planes get established on final
+    # or come closer than twice the go-around distance
+    def get_urgency(self):
+        tracked = [plane for plane in
+                   self.plane_states[DEPARTURE] + self.plane_states[ARRIVAL] + self.plane_states[APPROACHING]
+                   if plane.tracked]
+        if not tracked:
+            return 0.0
+
+        urgency = 0.5
+        if any(plane.alt > 200 for plane in self.plane_states[APPROACHING] if plane.tracked):
+            urgency = 0.8
+
+        airborne = np.array([plane.alt > 200 for plane in tracked], dtype=bool)
+        engine = SeparationEngine.from_aircraft(tracked, [None] * len(tracked))
+        _, _, distance_btw_planes = engine.pairs_within(60, airborne, airborne)
+        if len(distance_btw_planes):
+            urgency = max(urgency, 1 - (distance_btw_planes.min() ** 0.5 - 30) / 60)
+
+        return min(urgency, 1.0)
+
+    # now is the time the page was read, in seconds on the clock decide was given
+    def get_command_list(self, now):
+        params = self.params
+        command_list = []
+
+        # Whether each plane may fly at full speed this tick, decided afresh every tick
+        clear_max_speed = {}
+
+        # Plan every arrival's runway and landing slot, both to vector the arrivals and to fit departures
+        # in between them
+        landing_slots = self.plan_arrivals()
+
+        # A departure on the ground, or one already cleared but still waiting, keeps its runway busy
+        # Departures are spaced by keeping every runway busy until the previous one has climbed to 200 feet
+        busy = {rto.runway for rto in self.plane_states[TAKEOFF_QUEUE] if rto.callsign in self.taking_off}
+        climbing = set()
+        for departure in self.plane_states[DEPARTURE]:
+            if departure.alt == 200:
+                for callsign, destination, altitude in self.airport.expedited_climbs:
+                    if callsign in departure.callsign and departure.destination == destination:
+                        command_list.append('{} C {} EX'.format(departure.callsign, altitude))
+                        break
+
+            if departure.tracked and departure.alt < 200:
+                busy.update(rto.runway for rto in self.plane_states[TAKEOFF_QUEUE])
+            if departure.tracked and departure.alt < params.climb_out_altitude:
+                climbing.add(departure.destination)
+
+        # Clear departures into the gaps between landings, see sequencing.py
+        queue = [(rto.callsign, rto.runway, rto.destination) for rto in self.plane_states[TAKEOFF_QUEUE]
+                 if rto.callsign not in self.taking_off]
+        destinations = {rto.callsign: rto.destination for rto in self.plane_states[TAKEOFF_QUEUE]}
+        for callsign in self.departure_scheduler.release(queue, landing_slots, busy, climbing):
+            command_list.append('{} C {} C 11 T'.format(callsign, destinations[callsign]))
+            self.taking_off.add(callsign)
+        # Arrivals still being vectored towards the target points
+        vectoring = set()
+
+        # Calculate headings for each plane on the approaching list
+        for arrival in self.plane_states[ARRIVAL]:
+            if not arrival.tracked:
+                continue
+
+            callsign = arrival.callsign
+            plane_heading = arrival.heading
+            plane_pos = arrival.pos
+            route = self.arrival_route(arrival)
+            target_points = route.target_points
+
+            if not callsign in self.arrival_states:
+                # Arrivals already past the target points are sent straight to the second one
+                if self.approach.past_gate(plane_pos):
+                    self.arrival_states[callsign] = 1
+                    command_list.append('{} C 2 EX'.format(callsign))
+                else:
+                    self.arrival_states[callsign] = 0
+                    command_list.append('{} C 4'.format(callsign))
+
+            elif self.arrival_states[callsign] == len(target_points):
+                command_list.append('{} L {}'.format(
+                    callsign, self.intercepting[callsign]))
+                continue
+
+            slot = landing_slots[callsign]
+            if self.arrival_states[callsign] > 0:
+                target_point = target_points[self.arrival_states[callsign]]
+            elif self.arrival_states[callsign] == 0:
+                # Stretch the path of an arrival that is early for its slot by moving its first target point
+                # away from the airport, half the extra distance each way
+                target_point = target_points[0]
+                stretched_x = target_point[0] + self.approach.outwards * slot.stretch / 2
+                target_point = (min(max(stretched_x, STRETCH_MARGIN), self.airport.width - STRETCH_MARGIN),
+                                target_point[1])
+            else:
+                target_point = self.waypts[self.airport.go_around_fix]
+            vectoring.add(callsign)
+
+            sqr_distance_to_target = calculate_sqr_distance(
+                plane_pos, target_point)
+
+            # Check if the plane is near the target point, or will be before the next tick or so
+            if sqr_distance_to_target < params.capture_sqr_distance or self.capturing(arrival, target_point):
+                self.arrival_states[callsign] += 1
+
+                command_list.append('{} C {}'.format(
+                    callsign, 4 - self.arrival_states[callsign]))
+                # Check if the plane is at the last point, and clear it for the runway its slot is on
+                if self.arrival_states[callsign] == len(target_points):
+                    hdg_str = str(route.intercept_heading)
+                    if len(hdg_str) < 3:
+                        hdg_str = '0' + hdg_str
+
+                    command_list.append('{} C {}'.format(callsign, hdg_str))
+                    command_list.append('{} L {}'.format(callsign, slot.runway))
+                    self.intercepting[callsign] = slot.runway
+                    vectoring.discard(callsign)
+                    continue
+
+            target_heading = calculate_heading(plane_pos, target_point)
+
+            # Planes still seen turning towards the target heading are left to finish the turn unless they are
+            # a long way off it
+            tolerance = params.heading_tolerance
+            if self.tracks.turning_towards(callsign, target_heading):
+                tolerance = max(tolerance, params.turning_tolerance)
+
+            if plane_heading is None or abs(target_heading - plane_heading) > tolerance:
+                hdg_str = str(target_heading)
+                while len(hdg_str) < 3:
+                    hdg_str = '0' + hdg_str
+
+                command_list.append('{} C {}'.format(callsign, hdg_str))
+
+        # Pairwise geometry of every tracked plane, shared by all of the separation checks below
+        tracked = [plane for plane in
+                   self.plane_states[ARRIVAL] + self.plane_states[APPROACHING] + self.plane_states[DEPARTURE]
+                   if plane.tracked]
+        motion = [self.plane_motion(plane) for plane in tracked]
+        engine = SeparationEngine.from_aircraft(tracked, [track for track, _ in motion],
+                                                [velocity for _, velocity in motion])
+        states = np.array([plane.state for plane in tracked], dtype=int)
+
+        # Ensure proper separation of arrival aircraft
+        # Only arrivals still being vectored towards the target points are spaced
+        vectored = np.array([plane.callsign in vectoring for plane in tracked], dtype=bool)
+        slot_times = np.array([landing_slots[plane.callsign].time if plane.callsign in landing_slots else np.inf
+                               for plane in tracked])
+
+        # Slow the plane landing later when a pair is predicted to lose spacing
+        i, j, _, _, _ = engine.conflicts(params.arrival_spacing, params.spacing_horizon, vectored, vectored)
+        too_close = slot_times[j] < slot_times[i]
+
+        slowed = np.zeros(len(tracked), dtype=bool)
+        slowed[i[too_close]] = True
+        # Arrivals early for their slot are slowed as well
+        for k in np.flatnonzero(vectored):
+            callsign = tracked[k].callsign
+            clear_max_speed[callsign] = not slowed[k] and landing_slots[callsign].delay <= params.slot_tolerance
+
+        # Ensure approaching planes are at the slower speed
+        for approaching in self.plane_states[APPROACHING]:
+            if not approaching.tracked:
+                continue
+
+            callsign = approaching.callsign
+            alt = approaching.alt
+            speed = approaching.speed
+            if speed < params.min_speed and alt > 900:
+                command_list.append('{} S {}'.format(callsign, params.min_speed))
+
+        # Ensure approaching planes don't collide
+        # Order go-around if dangerously close, go to the go-around fix from where the plane will be re-sequenced
+        # Of two planes on the same runway, the one further out along the approach is sent around
+        on_approach = (states == APPROACHING) & (engine.alt > 200)
+        i, j, _, _, _ = engine.conflicts(params.go_around_distance, params.go_around_horizon, on_approach,
+                                      on_approach)
+        runways = np.array([plane.runway or '' for plane in tracked], dtype=str)
+        outwards = np.array([self.airport.runway_directions.get(plane.runway, self.approach).outwards
+                             for plane in tracked], dtype=int)
+        behind = np.where(outwards[i] > 0, engine.x[i] > engine.x[j], engine.x[i] < engine.x[j])
+        alt_i = engine.alt[i]
+        alt_j = engine.alt[j]
+        go_around = (runways[i] == runways[j]) & (((alt_i == alt_j) & behind) | (alt_i > alt_j))
+
+        for k in np.unique(i[go_around]):
+            approaching = tracked[k]
+            command_list.append('{} A C 7 EX C {}'.format(
+                approaching.callsign, calculate_heading(approaching.pos, self.waypts[self.airport.go_around_fix])))
+            self.arrival_states[approaching.callsign] = -1
+            self.aircraft.emit(GO_AROUND, approaching.callsign)
+
+        # Ensure arrival planes don't crash into departing planes
+        # Only departures at least crossing_altitude feet above a nearby arrival can climb through its path
+        arrivals = states == ARRIVAL
+        departures = states == DEPARTURE
+        if arrivals.any():
+            for k in np.flatnonzero(departures):
+                clear_max_speed[tracked[k].callsign] = True
+
+        # Of a conflicting pair, the plane that will pass behind the other is slowed to open the gap
+        i, j, _, _, ahead = engine.conflicts(params.crossing_separation, params.crossing_horizon, arrivals,
+                                          departures)
+        crossing = engine.del_alt(i, j) >= params.crossing_altitude
+
+        for k, k_2, behind in zip(i[crossing], j[crossing], ahead[crossing]):
+            plane_to_slow = tracked[k] if behind else tracked[k_2]
+            clear_max_speed[plane_to_slow.callsign] = False
+
+        for plane in self.plane_states[DEPARTURE] + self.plane_states[ARRIVAL]:
+            if not plane.tracked:
+                continue
+
+            callsign = plane.callsign
+            speed = plane.speed
+
+            if not callsign in clear_max_speed.keys():
+                continue
+
+            if clear_max_speed[callsign] and speed < params.max_speed and not callsign in self.speeding_up \
+                    and plane.alt > 1000 and not any(slow in callsign for slow in self.airport.slow_callsigns):
+                command_list.append('{} S {}'.format(callsign, params.max_speed))
+                self.speeding_up.add(callsign)
+            elif not clear_max_speed[callsign] and (speed == params.max_speed or callsign in self.speeding_up):
+                command_list.append('{} S {}'.format(callsign, params.min_speed))
+                self.speeding_up.discard(callsign)
+            elif speed == params.max_speed:
+                self.speeding_up.discard(callsign)
+
+        # Only send commands that change what a plane has already been cleared to do
+        return self.clearance_ledger.filter(command_list, self.aircraft_table, now)
+
+    # Update the bot from a page read and return the commands to issue
+    # page is ('rows', snapshot rows) or ('html', strips html, canvas html), read at now seconds on any clock
+    # that only goes forwards, the current perf_counter unless given
+    def decide(self, page, now=None):
+        if now is None:
+            now = time.perf_counter()
+
+        with self.metrics.time('parse'):
+            if page[0] == 'rows':
+                self.parse_snapshot(page[1])
+            else:
+                self.parse_plane_strips(page[1])
+                self.parse_canvas(page[2])
+            self.tracks.record(now, self.aircraft_table.values())
+
+        with self.metrics.time('decide'):
+            return self.get_command_list(now)
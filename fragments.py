@@ -0,0 +1,40 @@
+# Parses page html one fragment at a time, remembering what each fragment parsed to
+# The html is split in front of every separator, which starts each aircraft's strip or radar label, and
+# anything before the first separator is ignored. A fragment is only parsed when its text was not in the
+# last page, so most of a tick's parsing is a dict lookup on the fragment's hash. Results for fragments
+# that have gone are forgotten on the next page
+class FragmentCache:
+    # parse(fragment) is given each fragment with its separator and returns its result, or None to skip it
+    def __init__(self, separator, parse):
+        self.separator = separator
+        self.parse_fragment = parse
+        # fragment text -> result, for the last page parsed
+        self.results = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.results = {}
+
+    # Results of every fragment of html, in page order
+    def parse(self, html):
+        previous = self.results
+        results = {}
+        parsed = []
+
+        for fragment in html.split(self.separator)[1:]:
+            if fragment in results:
+                result = results[fragment]
+            elif fragment in previous:
+                result = results[fragment] = previous[fragment]
+                self.hits += 1
+            else:
+                result = results[fragment] = self.parse_fragment(self.separator + fragment)
+                self.misses += 1
+
+            if result is not None:
+                parsed.append(result)
+
+        self.results = results
+        return parsed
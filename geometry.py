@@ -0,0 +1,34 @@
+import math
+
+# Geometry in the bot's radar coordinates, px with y growing upwards and headings in degrees
+
+
+# Calculate the heading a plane needs to take to get from its current pos to a point
+def calculate_heading(pos1, pos2):
+    dx = pos2[0] - pos1[0]
+    dy = pos2[1] - pos1[1]
+
+    initial_hdg = math.degrees(math.atan2(dx, dy))
+    if initial_hdg < 0:
+        initial_hdg += 360
+
+    return round(initial_hdg)
+
+
+# Calculate the squared distance between 2 points
+def calculate_sqr_distance(pos1, pos2):
+    dx = pos2[0] - pos1[0]
+    dy = pos2[1] - pos1[1]
+
+    sqr_d = (dx ** 2) + (dy ** 2)
+    return sqr_d
+
+
+# Calculate the distance between 2 points
+def calculate_distance(pos1, pos2):
+    return calculate_sqr_distance(pos1, pos2) ** 0.5
+
+
+# Calculates the difference between 2 headings
+def calculate_del_heading(hdg1, hdg2):
+    return abs((hdg2 - hdg1 + 540) % 360 - 180)
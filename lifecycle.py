@@ -0,0 +1,94 @@
+from aircraft import DEPARTURE, APPROACHING
+
+# Keeps the aircraft in play and turns each tick's strips into lifecycle events
+# Every tick the callsigns in play are compared with the last tick's as sets, giving
+#   spawn        - a callsign appeared
+#   state_change - a callsign moved to another state (see aircraft.py)
+#   handoff      - a departure left the game
+#   landing      - an aircraft on approach left the game
+#   remove       - any other aircraft left the game, such as one dropped from the takeoff queue
+# The controller emits go_around itself when it sends one around
+# Tables keyed by callsign that are attached to the store lose a callsign's entry as soon as it leaves the
+# game, so they never hold more than the aircraft in play
+
+SPAWN = 'spawn'
+STATE_CHANGE = 'state_change'
+HANDOFF = 'handoff'
+LANDING = 'landing'
+REMOVE = 'remove'
+GO_AROUND = 'go_around'
+
+LEAVING = (HANDOFF, LANDING, REMOVE)
+
+
+class Event:
+    __slots__ = ('kind', 'callsign', 'old_state', 'new_state')
+
+    def __init__(self, kind, callsign, old_state=None, new_state=None):
+        self.kind = kind
+        self.callsign = callsign
+        self.old_state = old_state
+        self.new_state = new_state
+
+    def __repr__(self):
+        return 'Event({}, {}, {} -> {})'.format(self.kind, self.callsign, self.old_state, self.new_state)
+
+
+class AircraftStore:
+    def __init__(self):
+        # Aircraft records in each state, in strip order
+        self.states = [[], [], [], []]
+        # callsign -> Aircraft record
+        self.table = {}
+
+        # event kind -> functions called with each Event of that kind
+        self.listeners = {}
+        # dicts and sets keyed by callsign, see attach
+        self.side_tables = []
+
+    # Call listener(event) for every event of a kind
+    def subscribe(self, kind, listener):
+        self.listeners.setdefault(kind, []).append(listener)
+
+    # Drop a callsign from table, a dict or set, once the aircraft leaves the game
+    def attach(self, table):
+        self.side_tables.append(table)
+        return table
+
+    def emit(self, kind, callsign, old_state=None, new_state=None):
+        event = Event(kind, callsign, old_state, new_state)
+        for listener in self.listeners.get(kind, ()):
+            listener(event)
+
+        if kind in LEAVING:
+            for table in self.side_tables:
+                if isinstance(table, set):
+                    table.discard(callsign)
+                else:
+                    table.pop(callsign, None)
+        return event
+
+    # Replace the aircraft in play with categories, one list of Aircraft per state as from tokenize_strips,
+    # and return the events this caused in the order they were emitted
+    def update(self, categories):
+        previous = self.table
+        self.states = categories
+        self.table = {plane.callsign: plane for category in categories for plane in category}
+
+        events = []
+        for callsign, plane in self.table.items():
+            before = previous.get(callsign)
+            if before is None:
+                events.append(self.emit(SPAWN, callsign, new_state=plane.state))
+            elif before.state != plane.state:
+                events.append(self.emit(STATE_CHANGE, callsign, before.state, plane.state))
+
+        for callsign, before in previous.items():
+            if callsign in self.table:
+                continue
+
+            state = before.state
+            kind = HANDOFF if state == DEPARTURE else LANDING if state == APPROACHING else REMOVE
+            events.append(self.emit(kind, callsign, old_state=state))
+
+        return events
@@ -1,645 +1,289 @@
-from selenium.webdriver import Firefox
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import ElementNotInteractableException
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.common.exceptions import WebDriverException
 
-import numpy as np
+import os
 import time
-import re
-import math
 import sys
-import msvcrt
-
-TAKEOFF_QUEUE = 0
-DEPARTURE = 1
-ARRIVAL = 2
-APPROACHING = 3
-
-# Plane States is an array that stores the state of each plane in play
-# It has a list of sub-arrays corresponding to each possible state
-# 0 - planes waiting to takeoff - (Callsign, Runway, Destination)
-# 1 - planes departing
-# 2 - planes being guided to their final approach
-# 3 - planes on final approach
-# Each index will contain an array of each plane in that state
-plane_list = []
-plane_states = [[], [], [], []]
-taking_off = []
-speeding_up = []
-intercepting = {}
-arrival_states = {}
-clear_max_speed = {}
-handoffs = 0
-landings = 0
-
-
-# Position of Waypoints
-WAYPTS = {}
-POS_EGLL = (800, 500)
-# Target points with 09 landing runway
-TARGET_POINTS_09_N = [(350, 750), (350, 550)]
-TARGET_POINTS_09_S = [(350, 250), (350, 450)]
-# Target points with 27 landing runway
-TARGET_POINTS_27_N = [(1350, 750), (1350, 550)]
-TARGET_POINTS_27_S = [(1350, 250), (1350, 450)]
-# Target points
-target_points = []
-landing_rwy = ''
-target_rwy = ''
-
-
-# Parse the data shown on the 'strips' on the right side of the screen
-def parse_plane_strips(html):
-    global plane_states, handoffs, landings
-
-    plane_list = []
-
-    temp = []
-    # Regex expression to parse the strips of the planes waiting to takeoff
-    to_queue_expression = \
-        r'<div id="(.+?)" name="\1".+? rgb\(192, 228, 250\);">\1 &nbsp;(\d{1,2}[LR]).+?To: (.{3,6})<'
-    for match in re.findall(to_queue_expression, html):
-        # print('Departure Callsign: {}, Runway: {}, Destination: {}'.format(match[0], match[1], match[2]))
-        temp.append([match[0], match[1], match[2]])
-        plane_list.append(match[0])
-
-    plane_states[TAKEOFF_QUEUE] = temp
-
-    temp = []
-    # Regex expression to parse the strips of the planes climbing to cruise
-    departure_expression = r'<div id="(.+?)" name="\1".+? rgb\(192, 228, 250\);">\1 &nbsp;(\D.+?) '
-    for match in re.findall(departure_expression, html):
-        # print('Departure Callsign: {}, Destination: {}'.format(match[0], match[1]))
-        temp.append([match[0], match[1]])
-        plane_list.append(match[0])
-        if match[0] in taking_off:
-            taking_off.remove(match[0])
-
-    for plane in plane_states[DEPARTURE]:
-        if len(plane) < 1:
-            continue
-
-        callsign = plane[0]
-        present = False
-
-        for plane_2 in temp:
-            if len(plane_2) < 1:
-                continue
-            if callsign == plane_2[0]:
-                present = True
-                break
-
-        if not present:
-            handoffs += 1
-
-    plane_states[DEPARTURE] = temp
-
-    temp = []
-    # Regex expression to parse the strips of the planes descending towards the airport
-    arrival_expression = r'<div id="(.+?)" name="\1".+? rgb\(252, 240, 198\);">\1 &nbsp;(\w[A-Z]{2,5}|\d{2,3}°)'
-    for match in re.findall(arrival_expression, html):
-        # print('Arrival Callsign: {}, Heading: {}'.format(match[0], match[1]))
-        temp.append([match[0], match[1].replace('°', '')])
-        plane_list.append(match[0])
-
-    plane_states[ARRIVAL] = temp
-
-    temp = []
-    # Regex expression to parse the strips of the planes on approach
-    approach_expression = r'<div id="(.+?)" name="\1".+? rgb\(252, 240, 198\);">\1 &nbsp;((?:9|27)[LR])'
-    for match in re.findall(approach_expression, html):
-        # print('Approach Callsign: {}, Runway: {}'.format(match[0], match[1]))
-        temp.append([match[0], match[1]])
-        plane_list.append(match[0])
-        if match[0] in arrival_states.keys():
-            arrival_states.pop(match[0])
-        if match[0] in intercepting.keys():
-            intercepting.pop(match[0])
-
-    for plane in plane_states[APPROACHING]:
-        if len(plane) < 1:
-            continue
-
-        callsign = plane[0]
-        present = False
-
-        for plane_2 in temp:
-            if len(plane_2) < 1:
-                continue
-            if callsign == plane_2[0]:
-                present = True
-                break
-
-        if not present:
-            landings += 1
-
-    plane_states[APPROACHING] = temp
-
-
-# Parse the data shown on the radar screen
-def parse_canvas(html):
-    parse_expression = r'<div id="(.+?)" class="SanSerif12".+?left: (.+?)px; top: (.+?)px.*\1<br>(\d{3}).(\d{2})'
-    for match in re.findall(parse_expression, html):
-        callsign = match[0]
-        # Iterate through each plane to find the matching callsign and then append the values of x, y and alt
-        # Quite inefficient but it works because there are only around 10 - 20 planes tops
-        # Might update indexing later to make this prettier
-        for category in plane_states:
-            for plane in category:
-                if plane[0] == callsign:
-                    plane.append(int(match[1]) + 25)   # x coord
-                    plane.append(950 - int(match[2]))  # y coord
-                    plane.append(int(match[3]) * 100)  # alt
-                    plane.append(int(match[4]))        # spd
-
-
-def parse_waypts(html):
-    parse_expression = r'<img src="draw_.+\.php\?ID=(.+?)&amp;TYPE=[01]" style="position: absolute; left: (-?\d+)px; top: (-?\d+)px'
-    for match in re.findall(parse_expression, html):
-        name = match[0]
-        pos_x = int(match[1]) + 25
-        pos_y = 950 - int(match[2])
-
-        WAYPTS[name] = (pos_x, pos_y)
-
-
-# Calculate the heading a plane needs to take to get from its current pos to a point
-def calculate_heading(pos1, pos2):
-    dx = pos2[0] - pos1[0]
-    dy = pos2[1] - pos1[1]
-
-    initial_hdg = math.degrees(math.atan2(dx, dy))
-    if initial_hdg < 0:
-        initial_hdg += 360
-
-    return round(initial_hdg)
-
-
-# Functions to help find intersection of plane paths
-def check_headings(point1, bearing1, point2, bearing2, intsec):
-    c = 450*math.pi/180
-    if (math.cos(c-(bearing1*math.pi/180))*(intsec[0]-point1[0]) > 0 or math.sin(c-(bearing1*math.pi/180))*(intsec[1]-point1[1]) > 0)\
-            and (math.cos(c-(bearing2*math.pi/180))*(intsec[0]-point2[0]) > 0 or math.sin(c-(bearing2*math.pi/180))*(intsec[1]-point2[1]) > 0):
-        # function returns a tuple with intersection (x,y) or None if there will be no intersection
-        return intsec
-    else:
-        return None
-
-
-# points to be given in tuple (x,y), bearing in degrees
-def calculate_intersection(point1, bearing1, point2, bearing2):
-    if bearing1 not in [0, 180]:
-        # equation in both x and y
-        gradient1 = math.tan((math.pi/2)-(bearing1*math.pi/180))
-        eq1 = np.array([1, -gradient1, point1[1]-(gradient1*point1[0])])
-    else:
-        # equation only in x
-        eq1 = np.array([0, 1, point1[0]])
-    if bearing2 not in [0, 180]:
-        # equation in both x and y
-        gradient2 = math.tan((math.pi/2)-(bearing2*math.pi/180))
-        eq2 = np.array([1, -gradient2, point2[1]-(gradient2*point2[0])])
-    else:
-        # equation only in x
-        eq2 = np.array([0, 1, point2[0]])
-
-    aug = np.array([eq1[-1], eq2[-1]])
-    augMatrix = np.array([eq1[:-1], eq2[:-1]])
-    try:
-        solution = np.linalg.solve(augMatrix, aug)
-        intsec = (solution[1], solution[0])
-        # returns tuple of intersection point or None
-        return check_headings(point1, bearing1, point2, bearing2, intsec)
-    except:
-        return None
-
-
-# Calculate the squared distance between 2 points
-def calculate_sqr_distance(pos1, pos2):
-    dx = pos2[0] - pos1[0]
-    dy = pos2[1] - pos1[1]
-
-    sqr_d = (dx ** 2) + (dy ** 2)
-    return sqr_d
-
-
-# Calculate the distance between 2 points
-def calculate_distance(pos1, pos2):
-    return calculate_sqr_distance(pos1, pos2) ** 0.5
-
-
-# Calculates the difference between 2 headings
-def calculate_del_heading(hdg1, hdg2):
-    return abs((hdg2 - hdg1 + 540) % 360 - 180)
-
-
-def get_command_list():
-    command_list = []
-    # Index 0 is Left Rwy, Index 1 is Right Rwy
-    safe_runways = [True, True]
-
-    # Update keys of cleared_max_speed according to the overall plane list
-    to_pop = []
-    for k in clear_max_speed.keys():
-        if not k in plane_list:
-            to_pop.append(k)
-
-    for p in to_pop:
-        clear_max_speed.pop(p)
-
-    # First find if it is safe for a plane to takeoff
-    # Check if the previous departure has achieved a particular speed in its takeoff run
-    # Also checks the position of the closest arrival
-    # When the plane reaches this speed it will have reached 1000 feet before the previous planes' departure
-    for departure in plane_states[DEPARTURE]:
-        if 'BEE' in departure[0] and departure[1] == 'BUZAD' and departure[4] == 200:
-            command_list.append('{} C 11 EX'.format(departure[0]))
-
-        if len(departure) >= 6 and departure[4] < 200:
-            safe_runways = [False, False]
-
-    for approaching in plane_states[APPROACHING]:
-        if len(approaching) >= 5 and (abs(approaching[2] - POS_EGLL[0]) < 45 or approaching[4] < 900):
-            if 'L' in approaching[1]:
-                safe_runways[0] = False
-            elif 'R' in approaching[1]:
-                safe_runways[1] = False
-
-    # Clear planes for takeoff accordingly
-    for rto in plane_states[TAKEOFF_QUEUE]:
-        if 'L' in rto[1] and safe_runways[0]:
-            callsign = rto[0]
-            if not callsign in taking_off:
-                destination = rto[2]
-                command_list.append(
-                    '{} C {} C 11 T'.format(callsign, destination))
-                taking_off.append(callsign)
-
-            safe_runways[0] = False
-        elif 'R' in rto[1] and safe_runways[1]:
-            callsign = rto[0]
-            if not callsign in taking_off:
-                destination = rto[2]
-                command_list.append(
-                    '{} C {} C 11 T'.format(callsign, destination))
-
-                taking_off.append(callsign)
-
-            safe_runways[1] = False
-
-    # Stores the squared distances to final
-    distances_to_final = {}
-
-    # Calculate headings for each plane on the approaching list
-    for arrival in plane_states[ARRIVAL]:
-        global target_rwy
-
-        callsign = arrival[0]
-        plane_heading = int(arrival[1])
-        plane_pos = (arrival[2], arrival[3])
-
-        if plane_pos[1] < 500:
-            if landing_rwy == '9':
-                target_points = TARGET_POINTS_09_S
-                intercept_hdg = 45
-            else:
-                target_points = TARGET_POINTS_27_S
-                intercept_hdg = 315
-        else:
-            if landing_rwy == '9':
-                target_points = TARGET_POINTS_09_N
-                intercept_hdg = 135
-            else:
-                target_points = TARGET_POINTS_27_N
-                intercept_hdg = 225
-
-        if not callsign in arrival_states:
-            if landing_rwy == '27':
-                if plane_pos[1] > 200 and plane_pos[1] < 800 and plane_pos[0] > 1350:
-                    arrival_states[callsign] = 1
-                    command_list.append('{} C 2 EX'.format(callsign))
-                else:
-                    arrival_states[callsign] = 0
-                    command_list.append('{} C 4'.format(callsign))
-            else:
-                if plane_pos[1] > 200 and plane_pos[1] < 800 and plane_pos[0] < 350:
-                    arrival_states[callsign] = 1
-                    command_list.append('{} C 2 EX'.format(callsign))
-                else:
-                    arrival_states[callsign] = 0
-                    command_list.append('{} C 4'.format(callsign))
-
-        elif arrival_states[callsign] == len(target_points):
-            command_list.append('{} L {}'.format(
-                callsign, intercepting[callsign]))
-            continue
-
-        if arrival_states[callsign] >= 0:
-            target_point = target_points[arrival_states[callsign]]
-        else:
-            target_point = WAYPTS['BNN']
-
-        sqr_distance_to_target = calculate_sqr_distance(
-            plane_pos, target_point)
-        distances_to_final[callsign] = sqr_distance_to_target
-
-        if arrival_states[callsign] <= 0:
-            distances_to_final[callsign] += 40000
-
-        if arrival_states[callsign] < 0:
-            distances_to_final[callsign] += calculate_sqr_distance(WAYPTS['BNN'], TARGET_POINTS_09_N[0]
-                                                                   if landing_rwy == '9' else TARGET_POINTS_27_N[0])
-
-        # Check if the plane is near the target point
-        if sqr_distance_to_target < 1000:
-            arrival_states[callsign] += 1
-
-            command_list.append('{} C {}'.format(
-                callsign, 4 - arrival_states[callsign]))
-            # Check if the plane is at the last point
-            if arrival_states[callsign] == len(target_points):
-                if 'L' in target_rwy:
-                    target_rwy = target_rwy.replace('L', 'R')
-                else:
-                    target_rwy = target_rwy.replace('R', 'L')
-                hdg_str = str(intercept_hdg)
-                if len(hdg_str) < 3:
-                    hdg_str = '0' + hdg_str
-
-                command_list.append('{} C {}'.format(callsign, hdg_str))
-                command_list.append('{} L {}'.format(callsign, target_rwy))
-                intercepting[callsign] = target_rwy
-                continue
-
-        target_heading = calculate_heading(plane_pos, target_point)
-
-        if abs(target_heading - plane_heading) > 5:
-            hdg_str = str(target_heading)
-            while len(hdg_str) < 3:
-                hdg_str = '0' + hdg_str
-
-            command_list.append('{} C {}'.format(arrival[0], hdg_str))
-
-    # Ensure proper separation of arrival aircraft
-    for arrival in plane_states[ARRIVAL]:
-        if len(arrival) < 6:
-            continue
-
-        callsign = arrival[0]
-
-        if arrival_states[callsign] == len(target_points):
-            continue
-
-        plane_pos = (arrival[2], arrival[3])
-        speed = arrival[5] * 10
-        hdg = int(arrival[1])
-
-        clear_max_speed[callsign] = True
-        for arrival_2 in plane_states[ARRIVAL]:
-            callsign_2 = arrival_2[0]
-            if len(arrival_2) < 6 or callsign_2 == callsign:
-                continue
-
-            pos_2 = (arrival_2[2], arrival_2[3])
-            hdg_2 = int(arrival[1])
-
-            if arrival_states[callsign_2] == len(target_points):
-                continue
-
-            distance_btw_planes = calculate_sqr_distance(
-                plane_pos, pos_2)
-
-            # Scale target distance by separation in headings
-            # Enables better dynamic spacing
-            target_distance = 85 + (1.5 * calculate_del_heading(hdg, hdg_2))
-            if distance_btw_planes < target_distance ** 2:
-                if distances_to_final[callsign_2] < distances_to_final[callsign]:
-                    clear_max_speed[callsign] = False
-                    break
-
-    # Ensure approaching planes are at 160 knots
-    for approaching in plane_states[APPROACHING]:
-        if len(approaching) < 6:
-            continue
-
-        callsign = approaching[0]
-        alt = approaching[4]
-        speed = approaching[5] * 10
-        if speed < 160 and alt > 900:
-            command_list.append('{} S 160'.format(callsign))
-
-    # Ensure approaching planes don't collide
-    for approaching in plane_states[APPROACHING]:
-        if len(approaching) < 5:
-            continue
-
-        callsign = approaching[0]
-        rwy = approaching[1]
-        pos = (approaching[2], approaching[3])
-
-        if approaching[4] <= 200:
-            continue
-
-        for approaching_2 in plane_states[APPROACHING]:
-            if len(approaching_2) < 4:
-                continue
-
-            if approaching_2[4] <= 200:
-                continue
-
-            callsign_2 = approaching_2[0]
-            rwy_2 = approaching_2[1]
-
-            if callsign == callsign_2 or rwy != rwy_2:
-                continue
-
-            pos_2 = (approaching_2[2], approaching_2[3])
-            distance_btw_planes = calculate_sqr_distance(
-                pos, pos_2)
-
-            # Order go-around if dangerously close, go to BNN from where the plane will be re-sequenced
-            if distance_btw_planes < 30 ** 2:
-                if approaching[4] == approaching_2[4]:
-                    if ('27' in rwy and (pos[0] > pos_2[0])) or ('9' in rwy and (pos[0] < pos_2[0])):
-                        command_list.append('{} A C 7 EX C {}'.format(
-                            callsign, calculate_heading(pos, WAYPTS['BNN'])))
-                        arrival_states[callsign] = -1
-                elif approaching[4] > approaching_2[4]:
-                    command_list.append('{} A C 7 EX C {}'.format(
-                        callsign, calculate_heading(pos, WAYPTS['BNN'])))
-                    arrival_states[callsign] = -1
-
-    # Ensure arrival planes don't crash into departing planes
-    for arrival in plane_states[ARRIVAL]:
-        if len(arrival) < 6:
-            continue
-
-        callsign = arrival[0]
-        hdg = int(arrival[1])
-        pos = (arrival[2], arrival[3])
-        alt = arrival[4]
-        spd = arrival[5]
-
-        for departure in plane_states[DEPARTURE]:
-            if len(departure) < 6:
-                continue
-
-            callsign_2 = departure[0]
-            dest_2 = departure[1]
-            pos_2 = (departure[2], departure[3])
-            alt_2 = departure[4]
-            spd_2 = departure[5]
-
-            clear_max_speed[callsign_2] = True
-            distance_btw_planes = calculate_distance(pos, pos_2)
-            if not distance_btw_planes < 110 or abs(alt - alt_2) < 1000 or (alt - alt_2) > 200:
-                continue
-
-            hdg_2 = calculate_heading(pos_2, WAYPTS[dest_2])
-            intersect = calculate_intersection(pos, hdg, pos_2, hdg_2)
-
-            if not intersect:
-                continue
-
-            rel_time_1 = calculate_distance(pos, intersect) / spd
-            rel_time_2 = calculate_distance(pos_2, intersect) / spd_2
-
-            if abs(rel_time_1 - rel_time_2) > 5:
-                continue
-
-            plane_to_slow = callsign if rel_time_1 > rel_time_2 else callsign_2
-            clear_max_speed[plane_to_slow] = False
-
-    for plane in plane_states[DEPARTURE] + plane_states[ARRIVAL]:
-        if len(plane) < 6:
-            continue
-
-        callsign = plane[0]
-        speed = plane[5] * 10
-
-        if not callsign in clear_max_speed.keys():
-            continue
-
-        if clear_max_speed[callsign] and speed < 240 and not callsign in speeding_up \
-                and plane[4] > 1000 and 'BEE' not in callsign:
-            command_list.append('{} S 240'.format(callsign))
-            speeding_up.append(callsign)
-        elif not clear_max_speed[callsign] and (speed == 240 or callsign in speeding_up):
-            command_list.append('{} S 160'.format(callsign))
-            if callsign in speeding_up:
-                speeding_up.remove(callsign)
-        elif speed == 240 and callsign in speeding_up:
-            speeding_up.remove(callsign)
-
-    return command_list
-
-
-def execute_commands(commands):
-    for command in commands:
-        print("Executing command:", command)
-        command_input.send_keys(command)
-        command_input.send_keys(Keys.ENTER)
-
-
-if __name__ == '__main__':
-    # Force background rendering to allow OBS recording
-    options = FirefoxOptions()
-    options.set_preference(
-        'widget.windows.window_occlusion_tracking.enabled', False)
-
-    # Start up firefox and open the website
-    driver = Firefox(options=options)
-    driver.maximize_window()
-    driver.get('http://atc-sim.com/')
-
-    # Login if details provided
-    if len(sys.argv) >= 3:
-        email = sys.argv[1]
-        pswd = sys.argv[2]
-        driver.find_element(by=By.XPATH,
-                            value='/html/body/div[3]/div/div/div/a[1]').click()
-        driver.find_element(by=By.XPATH,
-                            value='/html/body/div[4]/div[1]/table[1]/tbody/tr/td[1]/form/div/table/tbody/tr[1]/td[2]/input')\
-            .send_keys(email)
-        driver.find_element(by=By.XPATH,
-                            value='/html/body/div[4]/div[1]/table[1]/tbody/tr/td[1]/form/div/table/tbody/tr[2]/td[2]/input')\
-            .send_keys(pswd)
-        driver.find_element(by=By.XPATH,
-                            value='/html/body/div[4]/div[1]/table[1]/tbody/tr/td[1]/form/div/table/tbody/tr[3]/td[2]/input').click()
-        time.sleep(1)
-
-        # Change the airport and start the game
-        driver.find_element(by=By.XPATH,
-                            value='/html/body/div[4]/div[1]/form/table/tbody/tr/td[1]/div[1]/select/option[48]').click()
-    else:
-        # Change the airport and start the game
-        driver.find_element(by=By.XPATH,
-                            value='/html/body/div[4]/div[1]/form/table/tbody/tr/td[1]/div[1]/select/option[4]').click()
-
-    if len(sys.argv) == 4:
-        if sys.argv[3] == 'landing':
-            driver.find_element(by=By.XPATH,
-                            value='//*[@id="frmOptions"]/table/tbody/tr/td[1]/div[7]/select/option[3]').click()
-        elif sys.argv[3] == 'takeoff':
-            driver.find_element(by=By.XPATH,
-                            value='//*[@id="frmOptions"]/table/tbody/tr/td[1]/div[7]/select/option[4]').click()
-    
-    driver.find_element(by=By.XPATH,
-                        value='//*[@id="frmOptions"]/table/tbody/tr/td[1]/input[1]').click()
-    time.sleep(3)
-
-    if len(sys.argv) < 3:
-        failed = True
-        while failed:
+from contextlib import nullcontext
+
+import browser
+from controller import AIRPORT, Controller
+from params import load_params
+from scheduler import TickScheduler
+from pipeline import Pipeline
+from profiler import SlowTickProfiler, Tick
+from recording import Recorder
+from sessions import SessionPool
+from stopping import StopSignal
+from streaming import StreamConsumer
+
+
+def execute_commands(session, controller, commands):
+    with controller.metrics.time('dispatch'):
+        session.enter_commands(commands)
+    controller.metrics.count_commands(commands)
+    controller.metrics.flush()
+
+
+# Play one game on a prepared session, see sessions.py, until stop is set or minutes have passed
+# The other arguments are the command line flags below, with profiler a SlowTickProfiler or None
+def play(session, stop, minutes=None, stream=False, pipelined=False, metrics_path=None, params_path=None,
+         record=None, profiler=None):
+    # The game being played in the browser, see controller.py
+    controller = Controller(airport=session.airport)
+    if metrics_path is not None:
+        controller.metrics.export_to(metrics_path)
+
+    wind_dir, canvas_text = session.start()
+    driver = session.driver
+
+    # Check which direction the runways are landed in
+    controller.set_landing_runway(wind_dir)
+    if params_path is not None:
+        controller.set_params(load_params(params_path, controller.airport.name, controller.landing_rwy))
+
+    controller.parse_waypts(canvas_text)
+
+    recorder = None
+    if record is not None:
+        recorder = Recorder(record, wind_dir, canvas_text, airport=controller.airport.name,
+                            params=controller.params)
+
+    consumer = None
+    stream_version = 0
+    shown_text = None
+    if stream:
+        consumer = StreamConsumer()
+        consumer.start()
+        consumer.attach(driver, controller.airport.approach_pattern)
+        if not consumer.connected.wait(5):
+            print('The page did not connect to the stream, polling instead')
+            consumer.stop()
+            consumer = None
+
+    # Scrape the whole page in one script call, falling back to reading each element if the page refuses
+    use_snapshot = True
+    streaming = False
+    scheduler = TickScheduler(metrics=controller.metrics)
+    deadline = None if minutes is None else time.monotonic() + minutes * 60
+    # Published once per tick after commands are decided, so the stages the pipeline runs on worker threads
+    # read these instead of the Controller that is being changed on the trio thread
+    urgency = 0.0
+    aircraft = 0
+    counts = (0, 0)
+
+    # Read the page and return the perf_counter time it was read at and ('rows', rows) or, when reading element
+    # by element, ('html', strips, canvas)
+    # A streamed page is read at the moment the wait for it to change is over, not when the wait began, so
+    # the time neither stamps the positions early nor counts the wait as reading
+    # Only touches the page, so the pipeline can run it on a worker thread while commands are decided
+    def read_page():
+        nonlocal stream_version, shown_text, use_snapshot, streaming
+
+        read_at = time.perf_counter()
+        streaming = consumer is not None and consumer.connected.is_set()
+        text = 'Takeoffs: {}\n Landings: {}'.format(*counts)
+
+        if streaming:
+            # Wake as soon as the page reports a change, or after the scheduled period at the latest, but no
+            # sooner than the minimum period after the last tick
+            stream_version, rows = scheduler.wait_for_stream(
+                urgency, lambda timeout: consumer.wait(stream_version, timeout))
+            read_at = time.perf_counter()
+
+            if text != shown_text:
+                driver.execute_script(
+                    "document.evaluate('/html/body/div[1]/div/div[6]', document, null, "
+                    "XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue.innerText = arguments[0]", text)
+                shown_text = text
+            return read_at, ('rows', rows)
+
+        if use_snapshot:
             try:
-                driver.find_element(
-                    by=By.XPATH, value='//*[@id="btnclose"]').click()
-                failed = False
-            except ElementNotInteractableException:
-                time.sleep(1)
-
-    wind_dir = int(driver.find_element(by=By.XPATH,
-                                       value='//*[@id="winddir"]').get_attribute('innerHTML').split('<br>')[1].replace('°', ''))
-
-    # Check if the landing runway is 09 or 27
-    if calculate_del_heading(90, wind_dir) < calculate_del_heading(270, wind_dir):
-        landing_rwy = '9'
-        target_rwy = '9L'
-    else:
-        landing_rwy = '27'
-        target_rwy = '27R'
-
-    command_input = driver.find_element(by=By.XPATH,
-                                        value='//*[@id="canvas"]/div[1]/div/form/input[1]')
-
-    canvas_text = driver.find_element(by=By.XPATH,
-                                      value='//*[@id="canvas"]').get_attribute('innerHTML')
-
-    parse_waypts(canvas_text)
-
-    while True:
-        if msvcrt.kbhit() and ord(msvcrt.getch()) == 13:
-            execute_commands(['EXIT'])
-            time.sleep(1)
-            break
+                return read_at, ('rows', browser.take_snapshot(driver, controller.airport.approach_pattern, text))
+            except WebDriverException as e:
+                print('Snapshot failed, reading the page element by element:', e.msg)
+                use_snapshot = False
 
         driver.switch_to.frame('ProgressStrips')
         strips_text = driver.find_element(by=By.XPATH,
                                           value='//*[@id="strips"]').get_attribute('innerHTML')
-        parse_plane_strips(strips_text)
         driver.switch_to.parent_frame()
         canvas_text = driver.find_element(by=By.XPATH,
                                           value='//*[@id="canvas"]').get_attribute('innerHTML')
-        parse_canvas(canvas_text)
-        command_list = get_command_list()
-        execute_commands(command_list)
 
         count_display = driver.find_element(by=By.XPATH,
                                             value='/html/body/div[1]/div/div[6]')
+        driver.execute_script("arguments[0].innerText = arguments[1]", count_display, text)
+        return read_at, ('html', strips_text, canvas_text)
+
+    def timed_read_page():
+        read_at, page = read_page()
+        read_time = time.perf_counter() - read_at
+        controller.metrics.observe('scrape', read_time)
+        return page, read_at, read_time
+
+    def timed_decide(snapshot):
+        nonlocal urgency, aircraft, counts
+
+        page, read_at, read_time = snapshot
+        now = read_at if recorder is None else recorder.elapsed(read_at)
+        start = time.perf_counter()
+        commands = controller.decide(page, now=now)
+        if recorder is not None:
+            recorder.record(page, commands, read_time, time.perf_counter() - start, now=read_at)
+
+        urgency = controller.get_urgency()
+        aircraft = len(controller.aircraft_table)
+        counts = (controller.handoffs, controller.landings)
+        return commands
+
+    def dispatch(commands):
+        execute_commands(session, controller, commands)
+
+    def game_over():
+        return stop.is_set() or (deadline is not None and time.monotonic() >= deadline)
+
+    # Time the code in a with block as a tick, profiling it if it is slow, see profiler.py
+    def profiled(name):
+        if profiler is None:
+            return nullcontext(Tick(name, None))
+        return profiler.tick(name)
+
+    if pipelined:
+        # Each stage runs on its own thread, so each is profiled as a tick of its own
+        def profiled_read_page():
+            with profiled('scrape') as tick:
+                tick.aircraft = aircraft
+                return timed_read_page()
+
+        def profiled_decide(snapshot):
+            with profiled('decide') as tick:
+                commands = timed_decide(snapshot)
+                tick.aircraft = aircraft
+                tick.commands = len(commands)
+                return commands
+
+        def profiled_dispatch(commands):
+            with profiled('dispatch') as tick:
+                tick.aircraft = aircraft
+                tick.commands = len(commands)
+                dispatch(commands)
+
+        pipeline = Pipeline(profiled_read_page, profiled_decide, profiled_dispatch, scheduler,
+                            lambda: urgency, game_over, paced=lambda: not streaming)
+        pipeline.run()
+    else:
+        while not game_over():
+            scheduler.start()
+            with profiled('tick') as tick:
+                commands = timed_decide(timed_read_page())
+                dispatch(commands)
+                tick.aircraft = aircraft
+                tick.commands = len(commands)
+
+            if streaming:
+                scheduler.finish(urgency)
+            else:
+                scheduler.wait(urgency)
+
+    dispatch(['EXIT'])
+    time.sleep(1)
+    if consumer is not None:
+        consumer.stop()
+    if recorder is not None:
+        recorder.close()
+
+    controller.metrics.flush(force=True)
+    print(controller.metrics.summary())
+    if pipelined:
+        print('Snapshots: {}, dropped as stale: {}, batches dispatched: {}'.format(
+            pipeline.snapshots, pipeline.dropped, pipeline.batches))
+    if profiler is not None:
+        print('Slow ticks profiled: {} of {}, see {}'.format(profiler.slow_ticks, profiler.ticks,
+                                                           profiler.directory))
+
+
+# Remove a flag and the value after it from the command line, returning the value or default
+def pop_option(name, default=None):
+    if name not in sys.argv:
+        return default
+    i = sys.argv.index(name)
+    value = sys.argv[i + 1]
+    del sys.argv[i:i + 2]
+    return value
 
-        text = 'Takeoffs: {}\\n Landings: {}'.format(handoffs, landings)
-        driver.execute_script(
-            "arguments[0].innerText = '{}'".format(text), count_display)
 
-        time.sleep(2)
+if __name__ == '__main__':
+    # --stream has the page push changes over a websocket instead of being polled every tick
+    stream = '--stream' in sys.argv
+    if stream:
+        sys.argv.remove('--stream')
+
+    # --pipeline reads the next page while the last tick's commands are still being entered
+    pipelined = '--pipeline' in sys.argv
+    if pipelined:
+        sys.argv.remove('--pipeline')
+
+    # --headless runs Firefox without a window and without loading images or animations, for servers
+    headless = '--headless' in sys.argv
+    if headless:
+        sys.argv.remove('--headless')
+
+    # --airport NAME plays the airport described by airports/NAME.json, see profiles.py
+    airport = pop_option('--airport', AIRPORT)
+
+    # --metrics PATH keeps a Prometheus text file of tick timings and counters up to date
+    metrics_path = pop_option('--metrics')
+
+    # --params PATH plays with the constants tune.py found for the airport and the runway in use
+    params_path = pop_option('--params')
+
+    # --record PATH writes every page read and the commands decided from it to a recording for recording.py
+    record = pop_option('--record')
+
+    # --profile-slow DIR writes a stack profile of every tick that takes longer than --slow-tick SECONDS (1 by
+    # default) to DIR, keeping the newest 100, see profiler.py
+    profile_path = pop_option('--profile-slow')
+    slow_tick = float(pop_option('--slow-tick', 1.0))
+
+    # --games N plays N games one after another, each --minutes M long, while the next game's browser is
+    # prepared in the background. Without --minutes a game lasts until the bot is stopped
+    games = int(pop_option('--games', 1))
+    minutes = pop_option('--minutes')
+    if minutes is not None:
+        minutes = float(minutes)
+
+    # Login if details provided, and the traffic to play ('landing' or 'takeoff') after them
+    email = pswd = traffic = None
+    if len(sys.argv) >= 3:
+        email = sys.argv[1]
+        pswd = sys.argv[2]
+    if len(sys.argv) == 4:
+        traffic = sys.argv[3]
+
+    # Press Enter, Ctrl+C or send SIGTERM to stop the bot
+    stop = StopSignal()
+    profiler = None
+    if profile_path is not None:
+        profiler = SlowTickProfiler(profile_path, threshold=slow_tick)
+    pool = SessionPool(size=min(games, 2), headless=headless, email=email, pswd=pswd, traffic=traffic,
+                       airport=airport)
+    try:
+        for game in range(games):
+            session = pool.acquire()
+
+            game_record = record
+            if record is not None and games > 1:
+                root, ext = os.path.splitext(record)
+                game_record = '{}-{}{}'.format(root, game + 1, ext)
+
+            play(session, stop, minutes=minutes, stream=stream, pipelined=pipelined, metrics_path=metrics_path,
+                 params_path=params_path, record=game_record, profiler=profiler)
+            pool.release(session, reuse=game + 2 < games)
+            if stop.is_set():
+                break
+    finally:
+        pool.close()
+        if profiler is not None:
+            profiler.stop()
@@ -0,0 +1,195 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from clearances import parse_command
+
+# Timing and counters for the control loop, kept in fixed memory however long the session runs
+# Phase timings go into histograms with fixed buckets, counters are plain totals and gauges hold the last
+# value they were set to. All of them can be written out
+# in the Prometheus text format, for node_exporter's textfile collector or anything else that reads it,
+# and summarised at the end of a session
+
+# Bucket upper bounds in seconds, from 0.1 ms up to the longest tick the scheduler will choose
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.0, 4.0)
+
+PREFIX = 'atc_bot'
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the overflow bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # Estimate a quantile by interpolating within the bucket it falls in, as Prometheus does
+    def quantile(self, q):
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+# Kind of each clearance in a command, for counting commands by type
+def command_types(command):
+    _, clearances, _ = parse_command(command)
+    types = []
+    for name, value in clearances.items():
+        if name == 'lateral':
+            types.append(value[0])
+        elif name == 'runway':
+            types.append('landing')
+        else:
+            types.append(name)
+
+    tokens = command.split()[1:]
+    if 'A' in tokens:
+        types.append('go_around')
+    if 'T' in tokens:
+        types.append('takeoff')
+    return types or ['other']
+
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # phase -> Histogram
+        self.phases = {}
+        # (name, label value) -> total
+        self.counters = {}
+        # name -> value
+        self.gauges = {}
+
+        self.path = None
+        self.interval = None
+        self.last_flush = None
+
+    def clear(self):
+        with self.lock:
+            self.phases = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def observe(self, phase, seconds):
+        with self.lock:
+            if phase not in self.phases:
+                self.phases[phase] = Histogram(self.buckets)
+            self.phases[phase].observe(seconds)
+
+    @contextmanager
+    def time(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    # label is the value of the counter's only label, such as the command type for commands
+    def count(self, name, label=None, amount=1):
+        with self.lock:
+            self.counters[name, label] = self.counters.get((name, label), 0) + amount
+
+    def total(self, name, label=None):
+        with self.lock:
+            return self.counters.get((name, label), 0)
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def count_commands(self, commands):
+        for command in commands:
+            for kind in command_types(command):
+                self.count('commands', kind)
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            if self.phases:
+                name = PREFIX + '_phase_seconds'
+                lines.append('# HELP {} Time spent in each phase of a tick'.format(name))
+                lines.append('# TYPE {} histogram'.format(name))
+                for phase, histogram in sorted(self.phases.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{{phase="{}",le="{}"}} {}'.format(name, phase, bound, cumulative))
+                    lines.append('{}_sum{{phase="{}"}} {}'.format(name, phase, histogram.sum))
+                    lines.append('{}_count{{phase="{}"}} {}'.format(name, phase, histogram.count))
+
+            for counter in sorted({name for name, _ in self.counters}):
+                name = '{}_{}_total'.format(PREFIX, counter)
+                lines.append('# TYPE {} counter'.format(name))
+                for (other, label), value in sorted(self.counters.items(), key=lambda item: str(item[0])):
+                    if other != counter:
+                        continue
+                    if label is None:
+                        lines.append('{} {}'.format(name, value))
+                    else:
+                        lines.append('{}{{type="{}"}} {}'.format(name, label, value))
+
+            for gauge, value in sorted(self.gauges.items()):
+                name = '{}_{}'.format(PREFIX, gauge)
+                lines.append('# TYPE {} gauge'.format(name))
+                lines.append('{} {}'.format(name, value))
+
+        return '\n'.join(lines) + '\n'
+
+    # Write the Prometheus text to path every interval seconds from flush()
+    def export_to(self, path, interval=10.0):
+        self.path = path
+        self.interval = interval
+        self.last_flush = None
+
+    # Write the export file if it is due, or straight away with force set
+    # The file is replaced in one step so a reader never sees it half written
+    def flush(self, force=False):
+        if self.path is None:
+            return
+
+        now = time.monotonic()
+        if not force and self.last_flush is not None and now - self.last_flush < self.interval:
+            return
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, self.path)
+        self.last_flush = now
+
+    def summary(self):
+        lines = ['{:>10} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+            'phase', 'ticks', 'mean ms', 'p50 ms', 'p99 ms', 'max ms')]
+        with self.lock:
+            for phase, histogram in self.phases.items():
+                lines.append('{:>10} {:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+                    phase, histogram.count, histogram.sum / max(histogram.count, 1) * 1000,
+                    histogram.quantile(0.5) * 1000, histogram.quantile(0.99) * 1000, histogram.max * 1000))
+
+            for (name, label), value in sorted(self.counters.items(), key=lambda item: str(item[0])):
+                lines.append('{}: {}'.format(name if label is None else '{} {}'.format(name, label), value))
+            for name, value in sorted(self.gauges.items()):
+                lines.append('{}: {:.3f}'.format(name, value))
+
+        return '\n'.join(lines)
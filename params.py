@@ -0,0 +1,88 @@
+import json
+from dataclasses import dataclass, field, fields, asdict
+
+import sequencing
+
+# Tunable constants of the control logic, with the values the bot plays with unless told otherwise
+# Distances are in px, times in seconds, speeds in knots and altitudes in feet
+# Each field's range is the interval tune.py searches it over, and integer fields are kept to multiples
+# of their step
+
+
+def tunable(default, low, high, step=1):
+    return field(default=default, metadata={'range': (low, high), 'step': step})
+
+
+@dataclass(frozen=True)
+class Params:
+    # Conflict prediction, see SeparationEngine.conflicts
+    # Tracks are projected ahead from each plane's position, heading and speed, or its measured motion when it
+    # is seen flying some other way, see Controller.plane_motion, and a pair is in conflict
+    # if they will come closer than the separation for that kind of pair within the horizon
+    arrival_spacing: float = tunable(85, 50, 130)
+    spacing_horizon: float = tunable(30, 0, 90)
+    crossing_separation: float = tunable(30, 15, 80)
+    crossing_horizon: float = tunable(30, 0, 90)
+    # Height difference at which a departure can climb through an arrival's path
+    crossing_altitude: int = tunable(1000, 500, 3000, step=100)
+    go_around_distance: float = tunable(30, 15, 60)
+    go_around_horizon: float = tunable(10, 0, 30)
+
+    # Arrival vectoring
+    # Squared distance from a target point at which an arrival is turned towards the next one
+    capture_sqr_distance: float = tunable(1000, 300, 3000)
+    # Seconds ahead along its measured track an arrival is checked against the target point, so it is turned
+    # before it flies past between two ticks
+    capture_horizon: float = tunable(2, 0, 10)
+    # Heading error in degrees that is left alone rather than corrected
+    heading_tolerance: int = tunable(5, 1, 15)
+    # The same while the plane is seen to still be turning towards the heading it needs
+    turning_tolerance: int = tunable(15, 1, 45)
+    # Seconds an arrival may be early for its landing slot before it is slowed
+    slot_tolerance: float = tunable(10, 0, 40)
+    # Speeds assigned to planes that are clear to speed up and to planes that are slowed
+    # Speeds show on the radar in steps of 10 knots
+    max_speed: int = tunable(240, 200, 240, step=10)
+    min_speed: int = tunable(160, 160, 200, step=10)
+
+    # Departures keep their exit apart from departures still climbing below this altitude
+    climb_out_altitude: int = tunable(5000, 2000, 8000, step=1000)
+
+    # Sequencing, see sequencing.py
+    landing_interval: float = tunable(sequencing.LANDING_INTERVAL, 30, 90)
+    swap_margin: float = tunable(sequencing.SWAP_MARGIN, 0, 60)
+    max_stretch: float = tunable(sequencing.MAX_STRETCH, 0, 400)
+    takeoff_occupancy: float = tunable(sequencing.TAKEOFF_OCCUPANCY, 20, 80)
+    landing_buffer: float = tunable(sequencing.LANDING_BUFFER, 0, 40)
+
+    # A copy with the named fields changed, with integer fields rounded to their step
+    def replace(self, **changes):
+        for f in fields(self):
+            if f.name in changes and f.type is int:
+                step = f.metadata['step']
+                changes[f.name] = int(round(changes[f.name] / step)) * step
+        return type(self)(**{**asdict(self), **changes})
+
+
+# name -> (low, high) for every tunable field
+def search_space():
+    return {f.name: f.metadata['range'] for f in fields(Params)}
+
+
+# Tuned parameter files map an airport and landing direction to a parameter set, where missing fields keep
+# their defaults
+#   {"EGLL": {"9": {"arrival_spacing": 90, ...}, "27": {...}}}
+# The wind only matters to the bot through the runway direction it lands on, so that is what sets are kept for
+def load_params(path, airport, landing_rwy):
+    with open(path) as f:
+        tuned = json.load(f)
+    return Params().replace(**tuned.get(airport, {}).get(landing_rwy, {}))
+
+
+# tuned maps (airport, landing direction) to Params
+def save_params(path, tuned):
+    table = {}
+    for (airport, landing_rwy), params in sorted(tuned.items()):
+        table.setdefault(airport, {})[landing_rwy] = asdict(params)
+    with open(path, 'w') as f:
+        json.dump(table, f, indent=2)
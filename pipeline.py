@@ -0,0 +1,80 @@
+import trio
+
+# Runs the control loop as three overlapping stages instead of one after the other:
+#   scrape   - blocking call that reads the page and returns a snapshot, run on a worker thread
+#   decide   - turns a snapshot into a list of commands, run on the trio thread since it owns the bot state
+#   dispatch - blocking call that enters a list of commands, run on a worker thread
+# While one tick's commands are being dispatched the next tick's page is already being read
+# Stages are joined by channels that hold at most one item. A snapshot still waiting when a newer one
+# arrives is dropped, and commands are not decided until the dispatcher is free to enter them, so they
+# are always decided on the latest positions that have been read
+
+
+class Pipeline:
+    # urgency() feeds the scheduler after every scrape, stop() is polled once per tick and paced() says
+    # whether the scrape stage should sleep out the rest of its tick. A streamed page is paced by the
+    # scrape waiting on it, see TickScheduler.wait_for_stream, but its overruns are counted all the same
+    def __init__(self, scrape, decide, dispatch, scheduler, urgency, stop, paced=lambda: True):
+        self.scrape = scrape
+        self.decide = decide
+        self.dispatch = dispatch
+        self.scheduler = scheduler
+        self.urgency = urgency
+        self.stop = stop
+        self.paced = paced
+
+        self.snapshots = 0
+        self.dropped = 0
+        self.batches = 0
+
+    # Run until stop() returns true and the commands already decided have been dispatched
+    def run(self):
+        trio.run(self.serve)
+
+    async def serve(self):
+        snapshot_send, snapshot_receive = trio.open_memory_channel(1)
+        command_send, command_receive = trio.open_memory_channel(1)
+        # Held from the moment a batch is decided until it has been dispatched, so the next batch is only
+        # decided once the dispatcher can take it, on whatever snapshot is newest by then
+        dispatcher_free = trio.Semaphore(1, max_value=1)
+
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(self.scrape_stage, snapshot_send, snapshot_receive.clone())
+            nursery.start_soon(self.decide_stage, snapshot_receive, command_send, dispatcher_free)
+            nursery.start_soon(self.dispatch_stage, command_receive, dispatcher_free)
+
+    async def scrape_stage(self, snapshot_send, stale):
+        async with snapshot_send, stale:
+            while not self.stop():
+                self.scheduler.start()
+                snapshot = await trio.to_thread.run_sync(self.scrape)
+                self.snapshots += 1
+
+                try:
+                    snapshot_send.send_nowait(snapshot)
+                except trio.WouldBlock:
+                    stale.receive_nowait()
+                    self.dropped += 1
+                    snapshot_send.send_nowait(snapshot)
+
+                _, remaining = self.scheduler.finish(self.urgency())
+                if self.paced():
+                    await trio.sleep(remaining)
+
+    async def decide_stage(self, snapshot_receive, command_send, dispatcher_free):
+        async with snapshot_receive, command_send:
+            while True:
+                await dispatcher_free.acquire()
+                try:
+                    snapshot = await snapshot_receive.receive()
+                except trio.EndOfChannel:
+                    return
+
+                await command_send.send(self.decide(snapshot))
+
+    async def dispatch_stage(self, command_receive, dispatcher_free):
+        async with command_receive:
+            async for commands in command_receive:
+                await trio.to_thread.run_sync(self.dispatch, commands)
+                self.batches += 1
+                dispatcher_free.release()
@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Stack profiles of the ticks that ran over budget, and of no others
+# Every tick is timed. While one is running a sampler thread takes the stack of the thread running it every
+# interval seconds, so when a tick turns out to have taken longer than threshold seconds its samples are
+# already there to be written out. Ticks within the threshold throw their samples away
+# Each slow tick is written to its own file in the folded format flamegraph.pl, inferno and speedscope read,
+# one line per distinct stack with the thread at the root and the number of samples at the end
+#   MainThread;main.py:play;main.py:timed_decide;controller.py:decide 12
+# File names carry when the tick ran, how long it took, how many aircraft were in play and how many
+# commands it sent. Only the newest keep files are kept in the directory
+
+# Seconds between samples, short enough to catch a regex or a WebDriver call that holds up a tick
+INTERVAL = 0.005
+EXTENSION = '.folded'
+
+
+# One tick being timed on a thread
+# aircraft and commands are filled in by the code running the tick, for the file name
+class Tick:
+    __slots__ = ('name', 'thread', 'start', 'samples', 'aircraft', 'commands')
+
+    def __init__(self, name, thread):
+        self.name = name
+        self.thread = thread
+        self.start = time.perf_counter()
+        # stack, root first -> samples
+        self.samples = {}
+        self.aircraft = 0
+        self.commands = 0
+
+
+class SlowTickProfiler:
+    def __init__(self, directory, threshold=1.0, interval=INTERVAL, keep=100):
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.keep = keep
+
+        self.lock = threading.Lock()
+        # thread ident -> Tick running on it
+        self.active = {}
+        # code object -> frame label
+        self.labels = {}
+
+        self.ticks = 0
+        self.slow_ticks = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.running = True
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.running = False
+        self.sampler.join()
+
+    # Time the code in the with block as one tick called name, writing its profile out if it is slow
+    # Ticks can run on several threads at once, one per thread
+    @contextmanager
+    def tick(self, name='tick'):
+        tick = Tick(name, threading.get_ident())
+        with self.lock:
+            self.active[tick.thread] = tick
+        try:
+            yield tick
+        finally:
+            elapsed = time.perf_counter() - tick.start
+            slow = elapsed > self.threshold
+            with self.lock:
+                del self.active[tick.thread]
+                self.ticks += 1
+                if slow:
+                    self.slow_ticks += 1
+            if slow:
+                self.write(tick, elapsed)
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+        return label
+
+    def sample(self):
+        # thread ident -> thread name, refreshed when a thread not seen before runs a tick
+        names = {}
+        while self.running:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    continue
+
+                frames = sys._current_frames()
+                for ident, tick in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+
+                    stack = []
+                    while frame is not None:
+                        stack.append(self.label(frame.f_code))
+                        frame = frame.f_back
+                    if ident not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    stack.append(names.get(ident, str(ident)))
+
+                    stack = tuple(reversed(stack))
+                    tick.samples[stack] = tick.samples.get(stack, 0) + 1
+
+    # The file is replaced in one step so a reader never sees it half written
+    def write(self, tick, elapsed):
+        name = '{}-{}-{}ms-{}aircraft-{}commands{}'.format(
+            int(time.time() * 1000), tick.name, round(elapsed * 1000), tick.aircraft, tick.commands, EXTENSION)
+        path = os.path.join(self.directory, name)
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            for stack, count in sorted(tick.samples.items(), key=lambda item: -item[1]):
+                f.write('{} {}\n'.format(';'.join(stack), count))
+        os.replace(temp_path, path)
+
+        self.rotate()
+
+    # Delete all but the newest keep profiles, file names start with the time so they sort oldest first
+    def rotate(self):
+        profiles = sorted(name for name in os.listdir(self.directory) if name.endswith(EXTENSION))
+        for name in profiles[:-self.keep]:
+            os.remove(os.path.join(self.directory, name))
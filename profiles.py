@@ -0,0 +1,145 @@
+import array
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from geometry import calculate_del_heading, calculate_distance
+
+# Airport profiles, everything the bot needs to know about the airport it plays and the screen it plays on
+# Each profile is a JSON file in the airports directory, see airports/EGLL.json
+#   menu_option        - position of the airport in the site's list, for guests and for logged in users
+#   screen             - browser window size, and the transform from page px to the bot's coordinates,
+#                        x = left + x_offset and y = y_origin - top
+#   radar              - width and height of the radar in the bot's coordinates
+#   position           - the airport, with the runway thresholds runway_half_length px either side of it
+#   go_around_fix      - the fix planes sent around fly back to, to be sequenced again from the north
+#   directions         - per landing direction, see Direction
+#   slow_callsigns     - callsigns containing any of these are never told to speed up, optional
+#   expedited_climbs   - departures whose callsign contains callsign and who fly to destination are told to
+#                        expedite their climb to altitude, in thousands of feet, once they reach 200 feet,
+#                        optional
+# A profile is compiled once per process, with a table of the distance from every pixel of the radar to the
+# runway thresholds, and shared by every Controller playing it
+
+AIRPORTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'airports')
+
+
+# An arrival route, the target points an arrival is vectored through, the heading it intercepts the
+# localiser on and the runway it lands on
+class Route:
+    def __init__(self, route, airport_position):
+        self.target_points = [tuple(point) for point in route['target_points']]
+        self.intercept_heading = route['intercept_heading']
+        self.runway = route['runway']
+
+        # Distance in px along the route from each target point to the airport
+        self.remaining = []
+        distance = 0
+        pos = airport_position
+        for point in reversed(self.target_points):
+            distance += calculate_distance(point, pos)
+            self.remaining.insert(0, distance)
+            pos = point
+
+
+# One landing direction, such as '9' for landing on 9L and 9R
+#   heading   - the direction planes land in, the wind picks the direction it is closest to
+#   runways   - the runways landed on, in the order the ArrivalManager tries them
+#   outwards  - 1 if arrivals are vectored in from larger x than the airport, -1 from smaller x
+#   gate      - x of the target points and the band of y between which an arrival already past that x is
+#               sent straight to its second target point
+#   north     - the Route for arrivals north of the airport, south the one for arrivals south of it
+class Direction:
+    def __init__(self, name, direction, airport_position):
+        self.name = name
+        self.heading = direction['heading']
+        self.runways = direction['runways']
+        self.outwards = direction['outwards']
+        self.gate_x = direction['gate']['x']
+        self.gate_y = tuple(direction['gate']['y'])
+        self.north = Route(direction['north'], airport_position)
+        self.south = Route(direction['south'], airport_position)
+
+    # Whether an arrival at pos is already past the gate
+    def past_gate(self, pos):
+        return self.gate_y[0] < pos[1] < self.gate_y[1] and (pos[0] - self.gate_x) * self.outwards > 0
+
+
+class Airport:
+    def __init__(self, profile):
+        self.name = profile['name']
+        self.menu_option = profile['menu_option']
+
+        screen = profile['screen']
+        self.window = tuple(screen['window'])
+        self.x_offset = screen['x_offset']
+        self.y_origin = screen['y_origin']
+
+        self.width, self.height = profile['radar']
+        self.position = tuple(profile['position'])
+        self.runway_half_length = profile['runway_half_length']
+        self.go_around_fix = profile['go_around_fix']
+        self.directions = {name: Direction(name, direction, self.position)
+                           for name, direction in profile['directions'].items()}
+        # runway -> the Direction it is landed on in
+        self.runway_directions = {runway: direction for direction in self.directions.values()
+                                  for runway in direction.runways}
+        # Matches the runway on the strip of an arrival on approach. The source is also handed to the in-page
+        # scripts, see browser.py, so it is kept to syntax Python and JavaScript read the same way. Longer
+        # names are tried first so one runway's name cannot match the start of another's
+        self.approach_pattern = '({})'.format('|'.join(
+            re.escape(runway) for runway in sorted(self.runway_directions, key=len, reverse=True)))
+        self.approach_expression = re.compile(self.approach_pattern)
+
+        self.slow_callsigns = tuple(profile.get('slow_callsigns', ()))
+        self.expedited_climbs = [(climb['callsign'], climb['destination'], climb['altitude'])
+                                 for climb in profile.get('expedited_climbs', ())]
+
+        # Distance in px from every pixel of the radar to the runway thresholds, flattened by rows of y into an
+        # array, which Python indexes faster than a numpy array
+        # Built from a column of y and a row of x offsets, so only the table itself is ever held in full
+        dx = np.arange(self.width, dtype=float) - self.position[0]
+        dy = np.arange(self.height, dtype=float)[:, None] - self.position[1]
+        distances = np.sqrt(dx * dx + dy * dy)
+        distances -= self.runway_half_length
+        np.maximum(distances, 0, out=distances)
+        self.threshold_distances = array.array('d', distances.tobytes())
+
+    # Radar position of something drawn at left, top on the page
+    def to_radar(self, left, top):
+        return left + self.x_offset, self.y_origin - top
+
+    def to_screen(self, x, y):
+        return x - self.x_offset, self.y_origin - y
+
+    # The landing direction that best faces into the wind, the later one in the profile on a tie
+    def landing_direction(self, wind_dir):
+        best = None
+        best_difference = None
+        for name, direction in self.directions.items():
+            difference = calculate_del_heading(direction.heading, wind_dir)
+            if best is None or difference <= best_difference:
+                best = name
+                best_difference = difference
+        return best
+
+    # Straight line distance from pos to the runway thresholds, or None off the radar or off a whole pixel
+    def threshold_distance(self, pos):
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < self.height:
+            try:
+                return self.threshold_distances[y * self.width + x]
+            except TypeError:
+                return None
+        return None
+
+
+# The compiled profile of an airport, by its name in the airports directory
+# Compiled once per process, so every Controller shares the same tables
+@lru_cache(maxsize=None)
+def load_airport(name):
+    with open(os.path.join(AIRPORTS_DIRECTORY, name + '.json')) as f:
+        return Airport(json.load(f))
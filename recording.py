@@ -0,0 +1,152 @@
+import argparse
+import json
+import mmap
+import os
+import time
+import zlib
+from dataclasses import asdict
+
+import numpy as np
+
+from controller import AIRPORT, Controller
+from params import Params
+from profiles import load_airport
+
+# Session recordings: every page the bot read, the commands it decided on and how long each step took
+# A recording is one zlib stream of newline separated JSON frames, flushed after every frame so a crash
+# loses at most the frame being written. The first frame describes the session
+#   {"wind": wind direction, "canvas": canvas html the waypoints were parsed from, "started": unix time,
+#    "airport": name of the airport profile played, "params": the Params played with, as a dict}
+# and every frame after it is one tick
+#   {"t": seconds since the start when the page was read, unrounded so a replay decides on exactly the time
+#    the game did, "page": page as passed to Controller.decide,
+#    "commands": [...], "read": seconds spent reading the page, "decide": seconds spent deciding}
+# Recordings made before the airport and params were written are replayed with EGLL and the default Params
+# Pages repeat most of the previous tick's text, so the shared compression window keeps ticks small
+
+CHUNK_SIZE = 1 << 18
+
+
+# airport is the name of the airport profile and params the Params the session is played with
+class Recorder:
+    def __init__(self, path, wind_dir, canvas_html, airport=AIRPORT, params=None, level=6,
+                 clock=time.perf_counter):
+        self.file = open(path, 'wb')
+        self.compressor = zlib.compressobj(level)
+        self.clock = clock
+        self.start = clock()
+        self.frames = 0
+
+        self.write({'wind': wind_dir, 'canvas': canvas_html, 'started': time.time(), 'airport': airport,
+                    'params': asdict(params or Params())})
+
+    def write(self, frame):
+        data = json.dumps(frame, separators=(',', ':')).encode() + b'\n'
+        self.file.write(self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.file.flush()
+        self.frames += 1
+
+    # now is the clock time the page was read at, the time of recording unless given
+    # Seconds since the recording started at clock time now, exactly as a frame read at now records it
+    # Passing this to Controller.decide instead of now gives a replay the very same clock as the game
+    def elapsed(self, now):
+        return now - self.start
+
+    def record(self, page, commands, read_time, decide_time, now=None):
+        if now is None:
+            now = self.clock()
+        self.write({'t': self.elapsed(now), 'page': page, 'commands': commands,
+                    'read': round(read_time, 6), 'decide': round(decide_time, 6)})
+
+    def close(self):
+        self.file.write(self.compressor.flush())
+        self.file.close()
+
+
+# Yield the frames of a recording one at a time
+# The file is memory-mapped and decompressed a chunk at a time, so memory use does not grow with its length
+# Recordings that were cut off, or several recordings concatenated, are read as far as they go
+def read_frames(path, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            decompressor = zlib.decompressobj()
+            pending = b''
+
+            for offset in range(0, len(data), chunk_size):
+                chunk = data[offset:offset + chunk_size]
+                while chunk:
+                    lines = (pending + decompressor.decompress(chunk)).split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        yield json.loads(line)
+
+                    chunk = b''
+                    if decompressor.eof:
+                        chunk = decompressor.unused_data
+                        decompressor = zlib.decompressobj()
+
+
+# Feed a recording through a new Controller, playing the recorded airport with the recorded Params, without
+# a browser
+# Returns the number of ticks, how many decided different commands from the recording, what the bot counted
+# and the time spent deciding, so parser and logic changes can be checked and timed against real traffic
+def replay(path, verbose=False):
+    frames = read_frames(path)
+    header = next(frames, None)
+    if header is None:
+        raise ValueError('{} is an empty recording'.format(path))
+
+    params = Params(**header['params']) if 'params' in header else Params()
+    controller = Controller(params, airport=load_airport(header.get('airport', AIRPORT)))
+    controller.set_landing_runway(header['wind'])
+    controller.parse_waypts(header['canvas'])
+
+    ticks = 0
+    mismatches = 0
+    decide_times = []
+    recorded_times = []
+    for frame in frames:
+        start = time.perf_counter()
+        commands = controller.decide(frame['page'], now=frame['t'])
+        decide_times.append(time.perf_counter() - start)
+        recorded_times.append(frame['decide'])
+        ticks += 1
+
+        if commands != frame['commands']:
+            mismatches += 1
+            if verbose:
+                print('Tick {} at {:.1f}s'.format(ticks, frame['t']))
+                print('  recorded:', frame['commands'])
+                print('  replayed:', commands)
+
+    decide_times = np.array(decide_times or [0.0]) * 1000
+    recorded_times = np.array(recorded_times or [0.0]) * 1000
+    return {
+        'ticks': ticks,
+        'mismatches': mismatches,
+        'landings': controller.landings,
+        'handoffs': controller.handoffs,
+        'go_arounds': controller.metrics.total('go_arounds'),
+        'decide_ms_mean': decide_times.mean(),
+        'decide_ms_p99': np.percentile(decide_times, 99),
+        'recorded_decide_ms_mean': recorded_times.mean(),
+        'recorded_decide_ms_p99': np.percentile(recorded_times, 99),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded session through the bot')
+    parser.add_argument('path')
+    parser.add_argument('--verbose', action='store_true', help='print every tick whose commands differ')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = replay(args.path, verbose=args.verbose)
+    wall = time.perf_counter() - start
+
+    for key, value in result.items():
+        print('{}: {}'.format(key, round(value, 3) if isinstance(value, float) else value))
+    print('replayed in {:.2f}s'.format(wall))
@@ -0,0 +1,93 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import recording
+import simulator
+from controller import Controller
+
+# Runs many independent bot sessions at once, spread over the CPU cores
+# Every session is played by its own Controller in a worker process, either as a game against the
+# offline simulator or as a recording replayed through the bot, and the results are added up
+# Recordings replay what the bot saw rather than a game, so only the simulator reports separation losses
+# and runway incursions
+
+# Totals reported over all sessions, where a session has them
+TOTALS = ['ticks', 'landings', 'handoffs', 'go_arounds', 'separation_losses', 'runway_incursions', 'lost',
+          'mismatches']
+
+
+# Play one game against the simulator, settings holds run_session's arguments along with the minutes to
+# play and optionally the Params to play with
+def simulate(settings):
+    settings = dict(settings)
+    duration = settings.pop('minutes') * 60
+    controller = Controller(settings.pop('params', None))
+    return simulator.run_session(duration, controller=controller, **settings)
+
+
+# Worker entry point, job is ('simulate', settings) or ('replay', path)
+def run_job(job):
+    kind, argument = job
+    start = time.perf_counter()
+    result = simulate(argument) if kind == 'simulate' else recording.replay(argument)
+    result['wall'] = time.perf_counter() - start
+    return result
+
+
+# Run every job across processes worker processes, and return each job's result in the order given
+# along with the totals
+def run(jobs, processes=None):
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(run_job, jobs, chunksize=1)
+
+    totals = {name: sum(result[name] for result in results if name in result) for name in TOTALS}
+    return results, totals
+
+
+# One game for each seed from first_seed onwards, all with the same traffic
+def simulator_jobs(sessions, first_seed=0, **settings):
+    return [('simulate', dict(settings, seed=first_seed + k)) for k in range(sessions)]
+
+
+def describe(job):
+    kind, argument = job
+    if kind == 'replay':
+        return os.path.basename(argument)
+    return 'seed {}'.format(argument['seed'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many bot sessions in parallel and total their results')
+    parser.add_argument('--sessions', type=int, default=os.cpu_count(), help='simulator games to play')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, default one per core')
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--tick', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game, the rest count up from it')
+    parser.add_argument('--wind', type=int, default=None)
+    parser.add_argument('--arrivals', type=float, default=30, help='arrivals per hour')
+    parser.add_argument('--departures', type=float, default=30, help='departures per hour')
+    parser.add_argument('--adaptive', action='store_true', help='vary the tick period with traffic')
+    parser.add_argument('--recordings', nargs='+', default=[],
+                        help='replay these recordings instead of playing simulator games')
+    args = parser.parse_args()
+
+    if args.recordings:
+        jobs = [('replay', path) for path in args.recordings]
+    else:
+        jobs = simulator_jobs(args.sessions, args.seed, minutes=args.minutes, tick=args.tick, wind_dir=args.wind,
+                              adaptive=args.adaptive, arrival_rate=args.arrivals, departure_rate=args.departures)
+
+    start = time.perf_counter()
+    results, totals = run(jobs, args.processes)
+    wall = time.perf_counter() - start
+
+    names = [name for name in TOTALS if any(name in result for result in results)]
+    row = '{:>16} ' + ' '.join('{{:>{}}}'.format(max(len(name), 6)) for name in names)
+    print(row.format('session', *names))
+    for job, result in zip(jobs, results):
+        print(row.format(describe(job), *(result.get(name, '-') for name in names)))
+    print(row.format('total', *(totals[name] for name in names)))
+    print('{} sessions in {:.1f}s, {:.1f}s of session time'.format(
+        len(jobs), wall, sum(result['wall'] for result in results)))
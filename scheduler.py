@@ -0,0 +1,78 @@
+import time
+
+
+# Paces the control loop to a tick deadline instead of sleeping a fixed time after the work is done
+# The time spent scraping, deciding and dispatching is subtracted from the period, and the period itself
+# follows an urgency figure from 0 (empty sky) through 0.5 (normal traffic) to 1 (planes on final or
+# close to losing separation)
+# Ticks and overruns are counted, and exported through metrics if given a Metrics
+class TickScheduler:
+    def __init__(self, period=2.0, min_period=0.5, max_period=4.0, clock=time.monotonic, sleep=time.sleep,
+                 metrics=None):
+        self.period = period
+        self.min_period = min_period
+        self.max_period = max_period
+        self.clock = clock
+        self.sleep = sleep
+        self.metrics = metrics
+
+        self.tick_start = None
+        # When the last tick of a streamed page woke, see wait_for_stream
+        self.woken = None
+        self.ticks = 0
+        self.overruns = 0
+        self.worst_overrun = 0.0
+
+    # Target period for an urgency, interpolating between max_period, period and min_period
+    def choose_period(self, urgency):
+        urgency = min(max(urgency, 0.0), 1.0)
+        if urgency < 0.5:
+            return self.max_period + (self.period - self.max_period) * urgency * 2
+        return self.period + (self.min_period - self.period) * (urgency - 0.5) * 2
+
+    def start(self):
+        self.tick_start = self.clock()
+
+    # End the tick and return the period that was targeted and how much of it is left
+    # Ticks whose work took longer than the period are counted as overruns, and have nothing left
+    def finish(self, urgency):
+        period = self.choose_period(urgency)
+        elapsed = self.clock() - self.tick_start
+        self.ticks += 1
+        if self.metrics is not None:
+            self.metrics.count('ticks')
+
+        if elapsed > period:
+            self.overruns += 1
+            self.worst_overrun = max(self.worst_overrun, elapsed - period)
+            if self.metrics is not None:
+                self.metrics.count('overruns')
+                self.metrics.gauge('worst_overrun_seconds', self.worst_overrun)
+            return period, 0.0
+
+        return period, period - elapsed
+
+    # Wait for a streamed page to change, where wait_for_change(timeout) returns once the page has changed or
+    # timeout seconds have passed, and return what it returns
+    # Ticks are held at least min_period apart however often the page changes, and are at most the period for
+    # urgency apart when it does not. The tick restarts once the wait is over, so the time spent waiting is
+    # not counted towards an overrun
+    def wait_for_stream(self, urgency, wait_for_change):
+        timeout = self.choose_period(urgency)
+        if self.woken is not None:
+            hold = self.min_period - (self.clock() - self.woken)
+            if hold > 0:
+                self.sleep(hold)
+            timeout = max(timeout - (self.clock() - self.woken), 0.0)
+
+        result = wait_for_change(timeout)
+        self.woken = self.tick_start = self.clock()
+        return result
+
+    # Sleep out the rest of the tick and return the period that was targeted
+    def wait(self, urgency):
+        period, remaining = self.finish(urgency)
+        if remaining > 0:
+            self.sleep(remaining)
+
+        return period
@@ -0,0 +1,166 @@
+import numpy as np
+
+# Above this many aircraft, short range queries find pairs through a uniform grid instead of the
+# full distance matrix
+# Long range queries cover most of the radar anyway, so they always use the matrix
+GRID_THRESHOLD = 200
+GRID_MAX_RADIUS = 150
+
+# Radar scale, used to turn speeds in knots into px per second
+PX_PER_NM = 25
+
+
+# Closest point of approach for pairs of aircraft flying straight at constant speed
+# dx, dy is the position of the second aircraft relative to the first in px and dvx, dvy its relative
+# velocity in px per second. The time of closest approach is limited to the next horizon seconds
+# Returns that time and the squared distance between the aircraft at it
+def closest_approach(dx, dy, dvx, dvy, horizon):
+    closing = dvx * dvx + dvy * dvy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(closing > 0, -(dx * dvx + dy * dvy) / closing, 0.0)
+    t = np.clip(t, 0.0, horizon)
+
+    cx = dx + dvx * t
+    cy = dy + dvy * t
+    return t, cx * cx + cy * cy
+
+
+# Buckets points into square cells so that a query only compares points in neighbouring cells
+# The cell size must be at least the largest radius that will be queried
+class SpatialGrid:
+    def __init__(self, x, y, cell_size):
+        self.cell_size = cell_size
+        cx = np.floor(np.asarray(x) / cell_size).astype(np.int64)
+        cy = np.floor(np.asarray(y) / cell_size).astype(np.int64)
+
+        # Cells are keyed by a single integer so they can be sorted and binary searched
+        self.min_cy = cy.min() - 1 if len(cy) else 0
+        self.stride = (cy.max() - self.min_cy + 2) if len(cy) else 1
+        keys = cx * self.stride + (cy - self.min_cy)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    # Returns (query index, point index) for every point in the 3x3 block of cells around each query
+    def neighbours(self, qx, qy):
+        cx = np.floor(np.asarray(qx) / self.cell_size).astype(np.int64)
+        cy = np.floor(np.asarray(qy) / self.cell_size).astype(np.int64)
+
+        queries = []
+        points = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                ny = cy + dy - self.min_cy
+                valid = (ny >= 0) & (ny < self.stride)
+                keys = (cx + dx) * self.stride + ny
+                start = np.searchsorted(self.sorted_keys, keys, 'left')
+                stop = np.searchsorted(self.sorted_keys, keys, 'right')
+                counts = np.where(valid, stop - start, 0)
+
+                total = counts.sum()
+                if not total:
+                    continue
+
+                # Expand each query's [start, stop) range of sorted points without a Python loop
+                first = np.repeat(start - np.cumsum(counts) + counts, counts)
+                queries.append(np.repeat(np.arange(len(cx)), counts))
+                points.append(self.order[first + np.arange(total)])
+
+        if not queries:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(queries), np.concatenate(points)
+
+
+# Pairwise geometry of every aircraft in play, built once per tick
+# Positions in px, altitudes in feet, headings in degrees (NaN when unknown) and speeds in knots
+# velocity is the measured ground velocity (vx, vy) in px per second, see tracks.py, with NaN for aircraft
+# not yet seen moving. Aircraft with a measured velocity are projected along it, the rest along hdg at speed
+class SeparationEngine:
+    def __init__(self, x, y, alt, hdg, speed=None, velocity=None, grid_threshold=GRID_THRESHOLD):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.alt = np.asarray(alt, dtype=float)
+        self.hdg = np.asarray(hdg, dtype=float)
+        self.speed = np.full(len(self.x), np.nan) if speed is None else np.asarray(speed, dtype=float)
+        self.size = len(self.x)
+
+        # Velocity in px per second, aircraft with an unknown heading or speed are projected standing still
+        px_per_second = np.nan_to_num(self.speed) * PX_PER_NM / 3600
+        bearing = np.radians(self.hdg)
+        self.vx = np.nan_to_num(px_per_second * np.sin(bearing))
+        self.vy = np.nan_to_num(px_per_second * np.cos(bearing))
+        if velocity is not None:
+            vx, vy = (np.asarray(component, dtype=float) for component in velocity)
+            measured = ~np.isnan(vx) & ~np.isnan(vy)
+            self.vx = np.where(measured, vx, self.vx)
+            self.vy = np.where(measured, vy, self.vy)
+        self.use_grid = self.size > grid_threshold
+        self.sqr_distance = None
+
+    # velocities holds a (vx, vy) or None for each plane
+    @classmethod
+    def from_aircraft(cls, planes, headings, velocities=None, grid_threshold=GRID_THRESHOLD):
+        if velocities is not None:
+            velocities = np.array([(np.nan, np.nan) if velocity is None else velocity for velocity in velocities],
+                                  dtype=float).reshape(-1, 2).T
+        return cls([plane.x for plane in planes], [plane.y for plane in planes],
+                   [plane.alt for plane in planes],
+                   [np.nan if hdg is None else hdg for hdg in headings],
+                   [plane.speed for plane in planes],
+                   velocities, grid_threshold=grid_threshold)
+
+    # Squared distance between every pair of aircraft, built on the first matrix query
+    def build_matrices(self):
+        dx = self.x[None, :] - self.x[:, None]
+        dy = self.y[None, :] - self.y[:, None]
+        self.sqr_distance = dx * dx + dy * dy
+
+    def del_alt(self, i, j):
+        return self.alt[j] - self.alt[i]
+
+    def del_heading(self, i, j):
+        return np.abs((self.hdg[j] - self.hdg[i] + 540) % 360 - 180)
+
+    # All ordered pairs (i, j) with i in rows, j in cols and i != j that are closer than radius
+    # rows and cols are boolean masks over the aircraft
+    # Returns the index arrays and the squared distance of each pair
+    def pairs_within(self, radius, rows, cols):
+        row_index = np.flatnonzero(rows)
+        col_index = np.flatnonzero(cols)
+
+        if self.use_grid and radius <= GRID_MAX_RADIUS:
+            grid = SpatialGrid(self.x[col_index], self.y[col_index], radius)
+            i, j = grid.neighbours(self.x[row_index], self.y[row_index])
+            i = row_index[i]
+            j = col_index[j]
+            sqr_distance = (self.x[j] - self.x[i]) ** 2 + (self.y[j] - self.y[i]) ** 2
+        else:
+            if self.sqr_distance is None:
+                self.build_matrices()
+
+            block = self.sqr_distance[np.ix_(row_index, col_index)]
+            i, j = np.nonzero(block < radius ** 2)
+            sqr_distance = block[i, j]
+            i = row_index[i]
+            j = col_index[j]
+
+        keep = (i != j) & (sqr_distance < radius ** 2)
+        return i[keep], j[keep], sqr_distance[keep]
+
+    # Pairs (i, j) from pairs_within(rows, cols) whose tracks bring them closer than radius within
+    # the next horizon seconds, including pairs that already are
+    # Returns the index arrays, the time of closest approach, the squared distance then and whether j
+    # will be ahead of i along i's track at that time
+    def conflicts(self, radius, horizon, rows, cols):
+        max_speed = np.hypot(self.vx, self.vy).max() if self.size else 0.0
+        i, j, _ = self.pairs_within(radius + 2 * max_speed * horizon, rows, cols)
+
+        dx = self.x[j] - self.x[i]
+        dy = self.y[j] - self.y[i]
+        dvx = self.vx[j] - self.vx[i]
+        dvy = self.vy[j] - self.vy[i]
+        t, sqr_distance = closest_approach(dx, dy, dvx, dvy, horizon)
+
+        keep = sqr_distance < radius ** 2
+        i, j, t, sqr_distance = i[keep], j[keep], t[keep], sqr_distance[keep]
+        ahead = ((dx[keep] + dvx[keep] * t) * self.vx[i] + (dy[keep] + dvy[keep] * t) * self.vy[i]) > 0
+        return i, j, t, sqr_distance, ahead
@@ -0,0 +1,154 @@
+from separation import PX_PER_NM
+
+# Arrival manager
+# Every tick each arrival's time to the threshold is estimated along the rest of its route, and the
+# arrivals are given a runway and a landing slot so that landings on the same runway are at least
+# LANDING_INTERVAL seconds apart, each arrival taking whichever runway it can land on soonest
+# Arrivals keep their place in the sequence from tick to tick and only overtake the one ahead once they
+# are expected SWAP_MARGIN seconds sooner, so the plan does not flicker as the estimates move
+# Arrivals already cleared to land keep their runway and are slotted first
+# All times are in seconds from now
+
+LANDING_INTERVAL = 45
+SWAP_MARGIN = 20
+# Slowest speed the bot assigns before the approach, in knots, Params.min_speed once params are set
+MIN_SPEED = 160
+# Longest path stretch, in px
+MAX_STRETCH = 200
+
+
+# Seconds to fly a distance in px at a speed in knots, or at min_speed if slower
+def flight_time(distance, speed, min_speed=MIN_SPEED):
+    return distance / (max(speed, min_speed) * PX_PER_NM / 3600)
+
+
+class Slot:
+    __slots__ = ('runway', 'eta', 'time', 'stretch')
+
+    def __init__(self, runway, eta, time, stretch):
+        self.runway = runway
+        self.eta = eta
+        self.time = time
+        # Extra distance in px the arrival should fly because slowing down alone will not absorb its delay
+        self.stretch = stretch
+
+    @property
+    def delay(self):
+        return self.time - self.eta
+
+    def __repr__(self):
+        return 'Slot({}, eta={:.0f}, time={:.0f}, stretch={:.0f})'.format(
+            self.runway, self.eta, self.time, self.stretch)
+
+
+class ArrivalManager:
+    def __init__(self, runways=(), landing_interval=LANDING_INTERVAL, swap_margin=SWAP_MARGIN,
+                 max_stretch=MAX_STRETCH, min_speed=MIN_SPEED):
+        self.runways = list(runways)
+        self.landing_interval = landing_interval
+        self.swap_margin = swap_margin
+        self.max_stretch = max_stretch
+        self.min_speed = min_speed
+
+        # Callsigns in landing order, carried over between ticks
+        self.order = []
+        self.slots = {}
+
+    def clear(self):
+        self.order = []
+        self.slots = {}
+
+    # arrivals holds (callsign, distance to the threshold in px, speed in knots, runway it is cleared to
+    # land on or None, runway it would rather have) for every arrival
+    # Returns a Slot for each callsign
+    def plan(self, arrivals):
+        etas = {}
+        committed = {}
+        preferred = {}
+        distances = {}
+        for callsign, distance, speed, runway, preference in arrivals:
+            etas[callsign] = flight_time(distance, speed, self.min_speed)
+            distances[callsign] = distance
+            preferred[callsign] = preference
+            if runway is not None:
+                committed[callsign] = runway
+
+        self.update_order(etas)
+
+        free = {runway: None for runway in self.runways + list(set(committed.values()) - set(self.runways))}
+        self.slots = {}
+        # Cleared arrivals are already committed to a runway and close in, so they are slotted first
+        for callsign in sorted(committed, key=etas.get) + [callsign for callsign in self.order
+                                                            if callsign not in committed]:
+            eta = etas[callsign]
+            runways = [committed[callsign]] if callsign in committed else self.runways
+            runway = min(runways, key=lambda runway: (self.earliest(free[runway], eta),
+                                                      runway != preferred[callsign]))
+            time = self.earliest(free[runway], eta)
+            free[runway] = time
+
+            # What slowing to min_speed cannot absorb has to be flown, at min_speed
+            excess = time - flight_time(distances[callsign], self.min_speed, self.min_speed)
+            stretch = min(max(excess, 0) * self.min_speed * PX_PER_NM / 3600, self.max_stretch)
+            self.slots[callsign] = Slot(runway, eta, time, stretch)
+
+        return self.slots
+
+    def earliest(self, last_landing, eta):
+        if last_landing is None:
+            return eta
+        return max(eta, last_landing + self.landing_interval)
+
+    # Drop arrivals that have gone, slot new ones in by their estimate and let any arrival that is now
+    # clearly sooner than the one ahead of it move up one place
+    def update_order(self, etas):
+        order = [callsign for callsign in self.order if callsign in etas]
+        known = set(order)
+        for callsign in sorted((callsign for callsign in etas if callsign not in known), key=etas.get):
+            position = len(order)
+            while position > 0 and etas[order[position - 1]] > etas[callsign]:
+                position -= 1
+            order.insert(position, callsign)
+
+        for k in range(len(order) - 1):
+            if etas[order[k]] > etas[order[k + 1]] + self.swap_margin:
+                order[k], order[k + 1] = order[k + 1], order[k]
+
+        self.order = order
+
+
+# Seconds a departure holds its runway from its takeoff clearance until it lifts off
+TAKEOFF_OCCUPANCY = 40
+# Seconds kept clear ahead of each landing
+LANDING_BUFFER = 10
+
+
+# Departure release
+# A departure is cleared when its runway will stay free of landings for the whole takeoff roll, going by
+# the landing slots the arrival manager planned, so departures go in the gaps between arrivals
+# Runways that are busy with a departure are skipped, and each free runway releases one departure a tick
+# When several departures wait for the same runway, one heading for a different exit from the departures
+# still climbing out goes first so consecutive departures diverge, otherwise the queue order is kept
+class DepartureScheduler:
+    def __init__(self, takeoff_occupancy=TAKEOFF_OCCUPANCY, landing_buffer=LANDING_BUFFER):
+        self.takeoff_occupancy = takeoff_occupancy
+        self.landing_buffer = landing_buffer
+
+    # Seconds from now until the next landing slot on a runway
+    def next_landing(self, runway, slots):
+        return min((slot.time for slot in slots.values() if slot.runway == runway), default=float('inf'))
+
+    # queue holds (callsign, runway, destination) for every departure waiting to take off, in strip order
+    # slots are the landing slots from ArrivalManager.plan, busy is the set of runways that cannot be used
+    # and climbing is the set of exits of departures still climbing out
+    # Returns the callsigns to clear for takeoff
+    def release(self, queue, slots, busy, climbing):
+        released = []
+        for runway in sorted({runway for _, runway, _ in queue} - set(busy)):
+            if self.next_landing(runway, slots) < self.takeoff_occupancy + self.landing_buffer:
+                continue
+
+            waiting = [departure for departure in queue if departure[1] == runway]
+            released.append(min(waiting, key=lambda departure: departure[2] in climbing)[0])
+
+        return released
@@ -0,0 +1,233 @@
+import queue
+import threading
+
+from selenium.webdriver import Firefox
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+import browser
+from controller import AIRPORT
+from profiles import load_airport
+
+# Firefox sessions on atc-sim.com that can be prepared ahead of time and used for more than one game
+# A session is prepared up to the point where the game would start: the site is open, the user is logged
+# in if details were given and the airport and traffic are chosen. Starting the game is the only step
+# left, so a prepared session can be handed to the bot at once. After a game the same browser goes back
+# to the options page, keeping its login, rather than being closed
+# SessionPool prepares sessions on a background thread so they are ready before they are needed
+
+SITE = 'http://atc-sim.com/'
+# Seconds to wait for the page to show an element before giving up
+ELEMENT_TIMEOUT = 30
+
+# Cuts what a headless browser loads and draws, to keep the memory and CPU of each session down
+# Images are not loaded, but their tags, which the fixes are read from, are still on the page
+HEADLESS_PREFERENCES = {
+    'permissions.default.image': 2,
+    'toolkit.cosmeticAnimations.enabled': False,
+    'ui.prefersReducedMotion': 1,
+    'media.autoplay.default': 5,
+    'media.video_stats.enabled': False,
+    'browser.cache.disk.enable': False,
+    'browser.cache.memory.capacity': 16384,
+    'browser.sessionhistory.max_entries': 2,
+    'browser.sessionhistory.max_total_viewers': 0,
+    'network.prefetch-next': False,
+    'network.dns.disablePrefetch': True,
+    'dom.ipc.processCount': 1,
+    'fission.autostart': False,
+    'extensions.update.enabled': False,
+    'app.update.enabled': False,
+    'datareporting.policy.dataSubmissionEnabled': False,
+}
+
+# Positions in the traffic list
+TRAFFIC_OPTION = {'landing': 3, 'takeoff': 4}
+
+
+# window is the size the airport profile's screen positions were taken at
+def firefox_options(headless=False, window=(1920, 1080)):
+    options = FirefoxOptions()
+    # Force background rendering to allow OBS recording
+    options.set_preference('widget.windows.window_occlusion_tracking.enabled', False)
+
+    if headless:
+        options.add_argument('-headless')
+        options.add_argument('--width={}'.format(window[0]))
+        options.add_argument('--height={}'.format(window[1]))
+        for name, value in HEADLESS_PREFERENCES.items():
+            options.set_preference(name, value)
+    return options
+
+
+# One browser, logged in with email and pswd if given
+# traffic is 'landing' or 'takeoff' to only play arrivals or departures, or None for both
+# airport is the name of the airport profile to play, see profiles.py
+class Session:
+    def __init__(self, headless=False, email=None, pswd=None, traffic=None, airport=AIRPORT):
+        self.airport = load_airport(airport)
+        self.headless = headless
+        self.email = email
+        self.pswd = pswd
+        self.traffic = traffic
+
+        self.driver = None
+        self.command_input = None
+        self.games = 0
+
+        # Commands are sent in one script call per tick
+        # Any the page does not accept are typed in key by key, and if the page accepts none of them
+        # batching is turned off for the rest of the session
+        self.batch_dispatch = True
+
+    def wait_for(self, condition):
+        return WebDriverWait(self.driver, ELEMENT_TIMEOUT).until(condition)
+
+    def click(self, xpath):
+        self.wait_for(expected_conditions.element_to_be_clickable((By.XPATH, xpath))).click()
+
+    def element_html(self, xpath):
+        return self.driver.find_element(by=By.XPATH, value=xpath).get_attribute('innerHTML')
+
+    # Start up firefox, open the website and log in if details were given
+    def open(self):
+        self.driver = Firefox(options=firefox_options(self.headless, self.airport.window))
+        if not self.headless:
+            self.driver.maximize_window()
+        self.driver.get(SITE)
+
+        if self.email is not None:
+            self.click('/html/body/div[3]/div/div/div/a[1]')
+            form = '/html/body/div[4]/div[1]/table[1]/tbody/tr/td[1]/form/div/table/tbody'
+            self.wait_for(expected_conditions.visibility_of_element_located(
+                (By.XPATH, form + '/tr[1]/td[2]/input'))).send_keys(self.email)
+            self.driver.find_element(by=By.XPATH, value=form + '/tr[2]/td[2]/input').send_keys(self.pswd)
+            self.click(form + '/tr[3]/td[2]/input')
+
+    # Choose the airport and traffic, leaving the game ready to start
+    def prepare(self):
+        if self.driver is None:
+            self.open()
+        elif self.games:
+            # Back to the options page after a game, the login is kept in the browser's cookies
+            self.driver.get(SITE)
+
+        # The airport list is longer for logged in users
+        self.click('/html/body/div[4]/div[1]/form/table/tbody/tr/td[1]/div[1]/select/option[{}]'.format(
+            self.airport.menu_option['member' if self.email is not None else 'guest']))
+        if self.traffic in TRAFFIC_OPTION:
+            self.click('//*[@id="frmOptions"]/table/tbody/tr/td[1]/div[7]/select/option[{}]'.format(
+                TRAFFIC_OPTION[self.traffic]))
+
+    # Start the game and return the wind direction and the radar html the fixes are read from
+    def start(self):
+        self.click('//*[@id="frmOptions"]/table/tbody/tr/td[1]/input[1]')
+        if self.email is None:
+            # Guests are shown an introduction that has to be closed first
+            self.click('//*[@id="btnclose"]')
+
+        self.wait_for(lambda driver: '<br>' in self.element_html('//*[@id="winddir"]'))
+        wind_dir = int(self.element_html('//*[@id="winddir"]').split('<br>')[1].replace('°', ''))
+
+        self.command_input = self.wait_for(expected_conditions.presence_of_element_located(
+            (By.XPATH, '//*[@id="canvas"]/div[1]/div/form/input[1]')))
+        self.wait_for(lambda driver: 'draw_' in self.element_html('//*[@id="canvas"]'))
+
+        self.games += 1
+        return wind_dir, self.element_html('//*[@id="canvas"]')
+
+    def enter_commands(self, commands):
+        for command in commands:
+            print("Executing command:", command)
+
+        remaining = commands
+        if self.batch_dispatch and commands:
+            try:
+                results = browser.dispatch_commands(self.driver, commands)
+                remaining = [command for command, error in zip(commands, results) if error is not None]
+                for command, error in zip(commands, results):
+                    if error is not None:
+                        print("Batched command failed:", command, error)
+            except WebDriverException as e:
+                print("Batched dispatch failed:", e.msg)
+
+            if len(remaining) == len(commands):
+                self.batch_dispatch = False
+
+        for command in remaining:
+            self.command_input.send_keys(command)
+            self.command_input.send_keys(Keys.ENTER)
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+
+# Queued to stop the thread that prepares sessions
+STOP = object()
+
+
+# Keeps size sessions prepared on a background thread, see Session for the arguments
+# acquire() hands out a prepared session, waiting for one if none is ready yet, and release() gives it
+# back to be prepared for another game or closed
+class SessionPool:
+    def __init__(self, size=1, **session_args):
+        self.session_args = session_args
+        # Sessions waiting to be prepared, None for a new one
+        self.preparing = queue.Queue()
+        # Prepared sessions, or the exception that stopped one being prepared
+        self.ready = queue.Queue()
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.prepare_sessions, daemon=True)
+        self.thread.start()
+        for _ in range(size):
+            self.preparing.put(None)
+
+    def prepare_sessions(self):
+        while True:
+            session = self.preparing.get()
+            if session is STOP:
+                return
+            if self.closed:
+                if session is not None:
+                    session.close()
+                continue
+
+            if session is None:
+                session = Session(**self.session_args)
+            try:
+                session.prepare()
+            except WebDriverException as e:
+                session.close()
+                self.ready.put(e)
+                continue
+            self.ready.put(session)
+
+    def acquire(self):
+        session = self.ready.get()
+        if isinstance(session, Exception):
+            raise session
+        return session
+
+    def release(self, session, reuse=True):
+        if reuse and not self.closed:
+            self.preparing.put(session)
+        else:
+            session.close()
+
+    # Close every prepared session, and any still being prepared once it is
+    def close(self):
+        self.closed = True
+        self.preparing.put(STOP)
+        self.thread.join()
+
+        while not self.ready.empty():
+            session = self.ready.get()
+            if isinstance(session, Session):
+                session.close()
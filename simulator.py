@@ -0,0 +1,517 @@
+import argparse
+import math
+import random
+import time
+
+from controller import Controller
+from geometry import calculate_heading, calculate_sqr_distance
+from profiles import load_airport
+from profiler import SlowTickProfiler
+from recording import Recorder
+from scheduler import TickScheduler
+from separation import PX_PER_NM
+
+# Offline model of the atc-sim.com EGLL airspace
+# It renders the same strips / canvas HTML that main.py scrapes from the browser and
+# accepts the same command strings that main.py types into the command box, so the
+# bot's control loop can be stepped as fast as the CPU allows without Firefox
+
+# The airport and screen geometry the bot plays with, see profiles.py
+EGLL = load_airport('EGLL')
+POS_EGLL = EGLL.position
+RADAR_WIDTH = EGLL.width
+RADAR_HEIGHT = EGLL.height
+
+# Runway thresholds and landing headings around POS_EGLL
+RUNWAYS = {
+    '9L': ((700, 520), 90),
+    '9R': ((700, 480), 90),
+    '27R': ((900, 520), 270),
+    '27L': ((900, 480), 270),
+}
+
+# Fixes drawn on the radar
+# Departures are routed to one of the exit fixes, arrivals enter towards one of the entry fixes
+WAYPTS = {
+    'BNN': (600, 780),
+    'BPK': (1000, 830),
+    'LAM': (1300, 680),
+    'BIG': (1150, 230),
+    'OCK': (500, 220),
+    'CPT': (120, 380),
+    'BUZAD': (250, 840),
+    'WOD': (90, 520),
+    'MAY': (1050, 60),
+    'DVR': (1560, 140),
+    'DET': (1570, 360),
+}
+EXIT_FIXES = ['CPT', 'BUZAD', 'WOD', 'MAY', 'DVR', 'DET']
+ENTRY_FIXES = ['BNN', 'BPK', 'LAM', 'BIG', 'OCK']
+
+AIRLINES = ['BAW', 'VIR', 'EZY', 'DLH', 'AFR', 'KLM', 'UAE', 'AAL', 'BEE']
+
+# Aircraft performance
+TURN_RATE = 3                # degrees per second
+CLIMB_RATE = 2000 / 60       # feet per second
+EXPEDITE_RATE = 3000 / 60    # feet per second
+ACCELERATION = 2             # knots per second
+TAKEOFF_ACCELERATION = 4     # knots per second
+ROTATE_SPEED = 150
+MIN_SPEED = 160
+APPROACH_SPEED = 140
+MAX_SPEED = 250
+MAX_ALTITUDE = 40000
+GLIDE_SLOPE = 318            # feet per nm
+
+# Landing clearance is captured within this many px of the centreline
+CAPTURE_TOLERANCE = 6
+CAPTURE_ANGLE = 90
+
+# Standard separation minima
+SEPARATION_PX = 3 * PX_PER_NM
+SEPARATION_ALT = 1000
+
+STRIP_DEPARTURE_COLOUR = 'rgb(192, 228, 250)'
+STRIP_ARRIVAL_COLOUR = 'rgb(252, 240, 198)'
+
+# Aircraft lifecycle states inside the simulator
+QUEUED = 'queued'
+ROLLING = 'rolling'
+CLIMBING = 'climbing'
+INBOUND = 'inbound'
+ESTABLISHED = 'established'
+
+
+# Calculates the signed smallest turn from hdg1 to hdg2
+def signed_del_heading(hdg1, hdg2):
+    return (hdg2 - hdg1 + 540) % 360 - 180
+
+
+class SimAircraft:
+    __slots__ = ('callsign', 'departure', 'state', 'x', 'y', 'alt', 'speed', 'heading',
+                 'target_heading', 'target_alt', 'target_speed', 'direct', 'expedite',
+                 'runway', 'cleared_rwy', 'destination')
+
+    def __init__(self, callsign, departure, x, y, alt, speed, heading):
+        self.callsign = callsign
+        self.departure = departure
+        self.state = QUEUED if departure else INBOUND
+        self.x = x
+        self.y = y
+        self.alt = alt
+        self.speed = speed
+        self.heading = heading
+        self.target_heading = heading
+        self.target_alt = alt
+        self.target_speed = speed
+        self.direct = None
+        self.expedite = False
+        # Runway assigned for takeoff, or the runway the aircraft is established on
+        self.runway = None
+        # Landing clearance that has not been captured yet
+        self.cleared_rwy = None
+        self.destination = None
+
+
+class Simulator:
+    def __init__(self, seed=None, wind_dir=None, arrival_rate=30, departure_rate=30, max_aircraft=40):
+        self.rng = random.Random(seed)
+        self.wind_dir = wind_dir if wind_dir is not None else self.rng.randrange(0, 360, 10)
+        self.landing_dir = EGLL.landing_direction(self.wind_dir)
+        # Rates are aircraft per hour
+        self.arrival_rate = arrival_rate
+        self.departure_rate = departure_rate
+        self.max_aircraft = max_aircraft
+
+        self.time = 0.0
+        self.aircraft = {}
+
+        self.landings = 0
+        self.handoffs = 0
+        self.go_arounds = 0
+        self.lost = 0
+        self.separation_losses = 0
+        self.runway_incursions = 0
+        self.commands = 0
+        self.rejected = 0
+        self.conflicts = set()
+
+    def new_callsign(self):
+        while True:
+            callsign = self.rng.choice(AIRLINES) + str(self.rng.randint(1, 9999))
+            if callsign not in self.aircraft:
+                return callsign
+
+    def spawn_departure(self):
+        callsign = self.new_callsign()
+        runway = self.landing_dir + self.rng.choice('LR')
+        destination = 'BUZAD' if 'BEE' in callsign else self.rng.choice(EXIT_FIXES)
+        (x, y), heading = RUNWAYS[runway]
+
+        plane = SimAircraft(callsign, True, x, y, 0, 0, heading)
+        plane.runway = runway
+        plane.destination = destination
+        self.aircraft[callsign] = plane
+        return plane
+
+    def spawn_arrival(self):
+        callsign = self.new_callsign()
+        fix = WAYPTS[self.rng.choice(ENTRY_FIXES)]
+
+        # Enter from the radar edge on a line from the airport through the entry fix
+        bearing = math.radians(calculate_heading(POS_EGLL, fix))
+        x, y = POS_EGLL
+        while 0 < x < RADAR_WIDTH and 0 < y < RADAR_HEIGHT:
+            x += math.sin(bearing) * 10
+            y += math.cos(bearing) * 10
+        x = min(max(x, 5), RADAR_WIDTH - 5)
+        y = min(max(y, 5), RADAR_HEIGHT - 5)
+
+        heading = calculate_heading((x, y), fix)
+        alt = self.rng.choice([8000, 9000, 10000, 11000])
+        plane = SimAircraft(callsign, False, x, y, alt, MAX_SPEED - 10, heading)
+        self.aircraft[callsign] = plane
+        return plane
+
+    # Fill the airspace with a mix of aircraft in every strip category, used for benchmarking
+    def populate(self, count):
+        for i in range(count):
+            if i % 2:
+                plane = self.spawn_departure()
+                if i % 4 == 3:
+                    plane.state = CLIMBING
+                    plane.alt = plane.target_alt = self.rng.randrange(1000, 11000, 100)
+                    plane.speed = plane.target_speed = MAX_SPEED - 10
+            else:
+                plane = self.spawn_arrival()
+                if i % 4 == 2:
+                    plane.state = ESTABLISHED
+                    plane.runway = self.landing_dir + self.rng.choice('LR')
+                    plane.alt = plane.target_alt = self.rng.randrange(500, 4000, 100)
+                    plane.speed = plane.target_speed = MIN_SPEED
+
+            if plane.state != QUEUED:
+                plane.x = self.rng.uniform(0, RADAR_WIDTH)
+                plane.y = self.rng.uniform(0, RADAR_HEIGHT)
+
+    # Parse a command in the same syntax as the atc-sim.com command box
+    # Returns False if the command was rejected
+    def execute(self, command):
+        self.commands += 1
+        tokens = command.split()
+        if tokens == ['EXIT']:
+            return True
+        if len(tokens) < 2 or tokens[0] not in self.aircraft:
+            self.rejected += 1
+            return False
+
+        plane = self.aircraft[tokens[0]]
+        i = 1
+        try:
+            while i < len(tokens):
+                token = tokens[i]
+                if token == 'C':
+                    value = tokens[i + 1]
+                    i += 2
+                    if value in WAYPTS:
+                        plane.direct = value
+                    elif len(value) == 3 or int(value) > MAX_ALTITUDE // 1000:
+                        # Three digit values and anything above the ceiling are headings
+                        plane.target_heading = int(value) % 360
+                        plane.direct = None
+                    else:
+                        plane.target_alt = int(value) * 1000
+                        plane.expedite = i < len(tokens) and tokens[i] == 'EX'
+                        if plane.expedite:
+                            i += 1
+                elif token == 'S':
+                    plane.target_speed = min(max(int(tokens[i + 1]), MIN_SPEED), MAX_SPEED)
+                    i += 2
+                elif token == 'L':
+                    if plane.departure or tokens[i + 1] not in RUNWAYS:
+                        raise ValueError(command)
+                    plane.cleared_rwy = tokens[i + 1]
+                    i += 2
+                elif token == 'A':
+                    if plane.state == ESTABLISHED or plane.cleared_rwy:
+                        self.go_around(plane)
+                    i += 1
+                elif token == 'T':
+                    if plane.state != QUEUED:
+                        raise ValueError(command)
+                    if self.runway_occupied(plane.runway):
+                        self.runway_incursions += 1
+                    plane.state = ROLLING
+                    i += 1
+                else:
+                    raise ValueError(command)
+        except (ValueError, IndexError):
+            self.rejected += 1
+            return False
+
+        return True
+
+    def go_around(self, plane):
+        if plane.state == ESTABLISHED:
+            self.go_arounds += 1
+        plane.state = INBOUND
+        plane.cleared_rwy = None
+        plane.runway = None
+        plane.target_alt = max(plane.target_alt, 3000)
+        plane.target_speed = max(plane.target_speed, MIN_SPEED)
+
+    def fly(self, plane, dt):
+        # Departures fly runway heading until 1500 ft before turning towards their fix
+        if plane.direct and not (plane.state == CLIMBING and plane.alt < 1500):
+            plane.target_heading = calculate_heading((plane.x, plane.y), WAYPTS[plane.direct])
+
+        turn = signed_del_heading(plane.heading, plane.target_heading)
+        max_turn = TURN_RATE * dt
+        plane.heading = (plane.heading + max(-max_turn, min(max_turn, turn))) % 360
+
+        rate = (EXPEDITE_RATE if plane.expedite else CLIMB_RATE) * dt
+        plane.alt += max(-rate, min(rate, plane.target_alt - plane.alt))
+
+        accel = ACCELERATION * dt
+        plane.speed += max(-accel, min(accel, plane.target_speed - plane.speed))
+
+    def move(self, plane, dt):
+        distance = plane.speed / 3600 * dt * PX_PER_NM
+        plane.x += math.sin(math.radians(plane.heading)) * distance
+        plane.y += math.cos(math.radians(plane.heading)) * distance
+
+    def try_capture(self, plane):
+        (tx, ty), rwy_hdg = RUNWAYS[plane.cleared_rwy]
+        along = (tx - plane.x) * math.sin(math.radians(rwy_hdg)) + (ty - plane.y) * math.cos(math.radians(rwy_hdg))
+        lateral = (plane.x - tx) * math.cos(math.radians(rwy_hdg)) - (plane.y - ty) * math.sin(math.radians(rwy_hdg))
+
+        if along > 0 and abs(lateral) < CAPTURE_TOLERANCE \
+                and abs(signed_del_heading(plane.heading, rwy_hdg)) < CAPTURE_ANGLE:
+            plane.state = ESTABLISHED
+            plane.runway = plane.cleared_rwy
+            plane.cleared_rwy = None
+            plane.direct = None
+
+    def fly_approach(self, plane, dt):
+        (tx, ty), rwy_hdg = RUNWAYS[plane.runway]
+        along = (tx - plane.x) * math.sin(math.radians(rwy_hdg)) + (ty - plane.y) * math.cos(math.radians(rwy_hdg))
+
+        # Track the centreline and descend on the glide slope
+        plane.target_heading = calculate_heading((plane.x, plane.y), (tx, ty)) if along > 5 else rwy_hdg
+        glide_alt = max(along, 0) / PX_PER_NM * GLIDE_SLOPE
+        plane.target_alt = min(plane.target_alt, glide_alt)
+        plane.expedite = True
+        if plane.alt < 2000:
+            plane.target_speed = APPROACH_SPEED
+        self.fly(plane, dt)
+        self.move(plane, dt)
+
+        if along <= 2:
+            if plane.alt > 500:
+                self.go_around(plane)
+            else:
+                self.landings += 1
+                if self.runway_occupied(plane.runway):
+                    self.runway_incursions += 1
+                self.aircraft.pop(plane.callsign)
+
+    # Whether a departure is rolling on a runway
+    def runway_occupied(self, runway):
+        return any(plane.state == ROLLING and plane.runway == runway for plane in self.aircraft.values())
+
+    def step(self, dt):
+        self.time += dt
+
+        # Poisson arrivals of new traffic
+        if len(self.aircraft) < self.max_aircraft:
+            if self.rng.random() < self.arrival_rate / 3600 * dt:
+                self.spawn_arrival()
+            if self.rng.random() < self.departure_rate / 3600 * dt:
+                self.spawn_departure()
+
+        for plane in list(self.aircraft.values()):
+            if plane.state == QUEUED:
+                continue
+            elif plane.state == ROLLING:
+                plane.speed += TAKEOFF_ACCELERATION * dt
+                self.move(plane, dt)
+                if plane.speed >= ROTATE_SPEED:
+                    plane.state = CLIMBING
+                    plane.target_speed = MAX_SPEED - 10
+                    plane.expedite = False
+                    if plane.target_alt <= 0:
+                        plane.target_alt = 5000
+                continue
+            elif plane.state == ESTABLISHED:
+                self.fly_approach(plane, dt)
+                continue
+
+            self.fly(plane, dt)
+            self.move(plane, dt)
+
+            if plane.cleared_rwy:
+                self.try_capture(plane)
+
+            if plane.state == CLIMBING and calculate_sqr_distance(
+                    (plane.x, plane.y), WAYPTS[plane.destination]) < 20 ** 2:
+                self.handoffs += 1
+                self.aircraft.pop(plane.callsign)
+            elif not (0 <= plane.x <= RADAR_WIDTH and 0 <= plane.y <= RADAR_HEIGHT):
+                self.lost += 1
+                self.aircraft.pop(plane.callsign)
+
+        self.check_separation()
+
+    # Count each pair of aircraft that newly breaks the 3nm / 1000ft minima
+    def check_separation(self):
+        airborne = [p for p in self.aircraft.values() if p.state not in (QUEUED, ROLLING) and p.alt >= 1000]
+        conflicts = set()
+        for i, plane in enumerate(airborne):
+            for plane_2 in airborne[i + 1:]:
+                if abs(plane.alt - plane_2.alt) >= SEPARATION_ALT:
+                    continue
+                if calculate_sqr_distance((plane.x, plane.y), (plane_2.x, plane_2.y)) >= SEPARATION_PX ** 2:
+                    continue
+                # Parallel approaches to different runways are independent
+                if plane.state == ESTABLISHED and plane_2.state == ESTABLISHED and plane.runway != plane_2.runway:
+                    continue
+                conflicts.add(tuple(sorted((plane.callsign, plane_2.callsign))))
+
+        self.separation_losses += len(conflicts - self.conflicts)
+        self.conflicts = conflicts
+
+    def strip_html(self, plane):
+        cs = plane.callsign
+        if plane.departure:
+            colour = STRIP_DEPARTURE_COLOUR
+            if plane.state == QUEUED:
+                text = '{} &nbsp;{} &nbsp;A320<br>To: {}'.format(cs, plane.runway, plane.destination)
+            else:
+                text = '{} &nbsp;{} {}'.format(cs, plane.destination, plane.target_alt // 1000)
+        else:
+            colour = STRIP_ARRIVAL_COLOUR
+            if plane.state == ESTABLISHED:
+                text = '{} &nbsp;{} {}'.format(cs, plane.runway, int(plane.target_alt) // 1000)
+            else:
+                text = '{} &nbsp;{:03d}° {}'.format(cs, round(plane.target_heading) % 360,
+                                                    int(plane.target_alt) // 1000)
+
+        return '<div id="{0}" name="{0}" class="strip" style="background-color: {1};">{2}</div>'.format(
+            cs, colour, text)
+
+    def label_html(self, plane):
+        return ('<div id="{0}" class="SanSerif12" style="position: absolute; left: {1}px; top: {2}px; '
+                'color: rgb(0, 255, 0);">{0}<br>{3:03d} {4:02d}</div>').format(
+            plane.callsign, *EGLL.to_screen(round(plane.x), round(plane.y)),
+            min(int(plane.alt) // 100, 999), min(int(plane.speed) // 10, 99))
+
+    # innerHTML of the #strips element inside the ProgressStrips frame
+    def render_strips(self):
+        return '\n'.join(self.strip_html(plane) for plane in self.aircraft.values())
+
+    # innerHTML of the #canvas element
+    def render_canvas(self):
+        lines = ['<img src="draw_fix.php?ID={}&amp;TYPE=0" style="position: absolute; left: {}px; top: {}px;">'
+                 .format(name, *EGLL.to_screen(*pos)) for name, pos in WAYPTS.items()]
+        lines += [self.label_html(plane) for plane in self.aircraft.values() if plane.state != QUEUED]
+        return '\n'.join(lines)
+
+    def stats(self):
+        return {
+            'time': self.time,
+            'landings': self.landings,
+            'handoffs': self.handoffs,
+            'go_arounds': self.go_arounds,
+            'separation_losses': self.separation_losses,
+            'runway_incursions': self.runway_incursions,
+            'lost': self.lost,
+            'commands': self.commands,
+            'rejected': self.rejected,
+            'aircraft': len(self.aircraft),
+        }
+
+
+# Play a whole game against the simulator with a Controller, a new one unless controller is given
+# The physics is sub-stepped within each bot tick so large ticks stay stable
+# With adaptive set, each tick lasts as long as a TickScheduler would have chosen
+# With record set to a path, the session is written there as a recording that recording.py can replay
+# With profiler set to a SlowTickProfiler, the bot's slow ticks are profiled, see profiler.py
+def run_session(duration, tick=2.0, substep=0.5, seed=None, adaptive=False, record=None, controller=None,
+                profiler=None, **kwargs):
+    sim = Simulator(seed=seed, **kwargs)
+    scheduler = TickScheduler(period=tick)
+
+    if controller is None:
+        controller = Controller()
+    controller.parse_waypts(sim.render_canvas())
+    controller.set_landing_runway(sim.wind_dir)
+
+    recorder = None
+    if record is not None:
+        recorder = Recorder(record, sim.wind_dir, sim.render_canvas(), airport=controller.airport.name,
+                            params=controller.params, clock=lambda: sim.time)
+
+    ticks = 0
+    while sim.time < duration:
+        page = ('html', sim.render_strips(), sim.render_canvas())
+        start = time.perf_counter()
+        if profiler is not None:
+            with profiler.tick() as profiled:
+                commands = controller.decide(page, now=sim.time)
+                profiled.aircraft = len(controller.aircraft_table)
+                profiled.commands = len(commands)
+        else:
+            commands = controller.decide(page, now=sim.time)
+        if recorder is not None:
+            recorder.record(page, commands, 0.0, time.perf_counter() - start)
+
+        for command in commands:
+            sim.execute(command)
+
+        if adaptive:
+            tick = scheduler.choose_period(controller.get_urgency())
+
+        steps = max(1, round(tick / substep))
+        for _ in range(steps):
+            sim.step(tick / steps)
+        ticks += 1
+
+    if recorder is not None:
+        recorder.close()
+
+    stats = sim.stats()
+    stats['ticks'] = ticks
+    stats['bot_landings'] = controller.landings
+    stats['bot_handoffs'] = controller.handoffs
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the bot against the offline simulator')
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--tick', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--wind', type=int, default=None)
+    parser.add_argument('--arrivals', type=float, default=30, help='arrivals per hour')
+    parser.add_argument('--departures', type=float, default=30, help='departures per hour')
+    parser.add_argument('--adaptive', action='store_true', help='vary the tick period with traffic')
+    parser.add_argument('--record', default=None, help='write the session to this recording')
+    parser.add_argument('--profile-slow', default=None, metavar='DIR',
+                        help='write stack profiles of slow ticks to this directory')
+    parser.add_argument('--slow-tick', type=float, default=0.005, metavar='SECONDS',
+                        help='ticks taking longer than this are profiled')
+    args = parser.parse_args()
+
+    # Simulated ticks only take milliseconds, so they are sampled more often than ticks in the browser
+    profiler = None
+    if args.profile_slow is not None:
+        profiler = SlowTickProfiler(args.profile_slow, threshold=args.slow_tick, interval=0.0005)
+
+    start = time.perf_counter()
+    result = run_session(args.minutes * 60, tick=args.tick, seed=args.seed, wind_dir=args.wind,
+                         adaptive=args.adaptive, record=args.record, profiler=profiler, arrival_rate=args.arrivals, departure_rate=args.departures)
+    wall = time.perf_counter() - start
+
+    for key, value in result.items():
+        print('{}: {}'.format(key, value))
+    print('ticks per second: {:.0f}'.format(result['ticks'] / wall))
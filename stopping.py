@@ -0,0 +1,31 @@
+import signal
+import sys
+import threading
+
+# Tells the control loop to stop, on any platform
+# It is set by pressing Enter in the console, by Ctrl+C or by SIGTERM, so the bot can be stopped from a
+# terminal on Windows or Linux, or by a service manager on a server with no console attached
+class StopSignal:
+    # Must be created on the main thread, which is the only one that can install signal handlers
+    def __init__(self, console=True):
+        self.event = threading.Event()
+
+        signal.signal(signal.SIGINT, self.handle)
+        signal.signal(signal.SIGTERM, self.handle)
+
+        if console and sys.stdin is not None and sys.stdin.isatty():
+            threading.Thread(target=self.read_console, daemon=True).start()
+
+    def handle(self, signum, frame):
+        self.event.set()
+
+    # Enter, or the end of the input, stops the bot
+    def read_console(self):
+        sys.stdin.readline()
+        self.event.set()
+
+    def set(self):
+        self.event.set()
+
+    def is_set(self):
+        return self.event.is_set()
@@ -0,0 +1,148 @@
+import json
+import threading
+
+import trio
+from trio_websocket import serve_websocket, ConnectionClosed
+
+from browser import COLLECT_ROWS_SCRIPT
+
+# Push-based alternative to polling the page every tick
+# An observer injected into the page watches the strips and radar elements and, whenever either changes,
+# sends the aircraft rows that were added, updated or removed over a websocket to a local trio server
+# The server keeps the latest row for every callsign, so the main loop only has to wait for a change
+
+# arguments[0] is the websocket url of the StreamConsumer and arguments[1] the airport's approach pattern
+# Deltas are sent as {"add": [rows], "update": [rows], "remove": [callsigns]} using the collectRows() format
+OBSERVER_SCRIPT = COLLECT_ROWS_SCRIPT + r'''
+if (window.atcBotStream) {
+    window.atcBotStream.close();
+}
+
+var socket = new WebSocket(arguments[0]);
+var approachPattern = arguments[1];
+var previous = {};
+var pending = false;
+
+function publish() {
+    pending = false;
+    if (socket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+
+    var current = {};
+    var delta = {add: [], update: [], remove: []};
+    var rows = collectRows(approachPattern);
+    for (var i = 0; i < rows.length; i++) {
+        var key = rows[i][0];
+        current[key] = JSON.stringify(rows[i]);
+        if (!(key in previous)) {
+            delta.add.push(rows[i]);
+        } else if (previous[key] !== current[key]) {
+            delta.update.push(rows[i]);
+        }
+    }
+    for (var key in previous) {
+        if (!(key in current)) {
+            delta.remove.push(key);
+        }
+    }
+
+    previous = current;
+    if (delta.add.length || delta.update.length || delta.remove.length) {
+        socket.send(JSON.stringify(delta));
+    }
+}
+
+// Coalesce bursts of mutations into one scan
+function schedule() {
+    if (!pending) {
+        pending = true;
+        setTimeout(publish, 0);
+    }
+}
+
+socket.onopen = function () {
+    var options = {childList: true, subtree: true, characterData: true, attributes: true};
+    new MutationObserver(schedule).observe(stripsElement(), options);
+    new MutationObserver(schedule).observe(document.getElementById('canvas'), options);
+    publish();
+};
+
+window.atcBotStream = socket;
+'''
+
+
+# Runs a websocket server on a background thread and applies the page's deltas as they arrive
+class StreamConsumer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.rows = {}
+        self.version = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.connected = threading.Event()
+        self.started = threading.Event()
+
+        self.thread = None
+        self.trio_token = None
+        self.cancel_scope = None
+
+    @property
+    def url(self):
+        return 'ws://{}:{}'.format(self.host, self.port)
+
+    def start(self):
+        self.thread = threading.Thread(target=trio.run, args=(self.serve,), daemon=True)
+        self.thread.start()
+        self.started.wait()
+
+    def stop(self):
+        if self.trio_token is not None:
+            trio.from_thread.run_sync(self.cancel_scope.cancel, trio_token=self.trio_token)
+            self.thread.join()
+
+    # Inject the observer into the page so it starts streaming to this consumer
+    # approach_pattern is the airport's Airport.approach_pattern
+    def attach(self, driver, approach_pattern):
+        driver.execute_script(OBSERVER_SCRIPT, self.url, approach_pattern)
+
+    async def serve(self):
+        self.trio_token = trio.lowlevel.current_trio_token()
+        with trio.CancelScope() as self.cancel_scope:
+            async with trio.open_nursery() as nursery:
+                server = await nursery.start(serve_websocket, self.handle, self.host, self.port, None)
+                self.port = server.port
+                self.started.set()
+
+    async def handle(self, request):
+        ws = await request.accept()
+        with self.lock:
+            self.rows = {}
+        self.connected.set()
+
+        while True:
+            try:
+                message = await ws.get_message()
+            except ConnectionClosed:
+                self.connected.clear()
+                return
+
+            self.apply(json.loads(message))
+
+    def apply(self, delta):
+        with self.lock:
+            for row in delta.get('add', []) + delta.get('update', []):
+                self.rows[row[0]] = row
+            for callsign in delta.get('remove', []):
+                self.rows.pop(callsign, None)
+
+            self.version += 1
+            self.changed.notify_all()
+
+    # Block until the page reports a change newer than version, or timeout seconds pass
+    # Returns the latest version number and a copy of the rows, ready for Controller.parse_snapshot
+    def wait(self, version, timeout):
+        with self.lock:
+            self.changed.wait_for(lambda: self.version > version, timeout)
+            return self.version, list(self.rows.values())
@@ -0,0 +1,159 @@
+import numpy as np
+
+from separation import PX_PER_NM
+
+# The last few radar samples of every aircraft in play, and how it is actually moving according to them
+# Each aircraft is given a slot, a row of fixed size arrays that hold its last depth samples as a ring, so a
+# tick's samples are written and every aircraft's motion is estimated with a handful of array operations
+# Slots are freed as soon as an aircraft leaves the game and handed to the next one to appear, so memory
+# only grows with the most aircraft that were ever in play at once, however long the session
+# Estimates, one per slot and NaN until there are enough samples:
+#   vx, vy       - ground velocity in px per second, the least squares slope of position over time
+#   climb_rate   - feet per second, the same slope of altitude
+#   track        - direction of the ground velocity in degrees, as calculate_heading gives it
+#   ground_speed - knots
+#   turn_rate    - degrees per second, right turns positive, from the tracks over the older and newer half
+#                  of the samples
+
+# Samples kept per aircraft, 8 ticks is 16 seconds at the default tick period
+DEPTH = 8
+# Slots to start with, more are added if there are ever more aircraft in play
+SLOTS = 32
+# Tracks are only measured once an aircraft has moved at least this many px over its samples, since
+# positions are whole pixels
+MIN_TRACK_DISTANCE = 4
+# Turn rates smaller than this, in degrees per second, are measurement noise rather than a turn
+MIN_TURN_RATE = 1.0
+
+
+# Least squares slopes of samples over times along the last axis, one fit per mask, ignoring samples where
+# the mask is False
+# times is [slot, sample], samples [slot, quantity, sample] and masks [fit, slot, sample]
+# Returns the slopes by [fit, slot, quantity], NaN where a fit has fewer than 2 samples, and the mean time
+# of each fit's samples
+def slopes(times, samples, masks):
+    count = masks.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_time = np.where(masks, times, 0).sum(axis=-1) / count
+        dt = np.where(masks, times - mean_time[..., None], 0)
+        mean = (samples * masks[:, :, None, :]).sum(axis=-1) / count[..., None]
+        # Samples outside the fit have dt 0, so they need no masking here
+        slope = (dt[:, :, None, :] * (samples - mean[..., None])).sum(axis=-1) / (dt * dt).sum(axis=-1)[..., None]
+    return np.where(count[..., None] >= 2, slope, np.nan), mean_time
+
+
+def track_angle(vx, vy):
+    with np.errstate(invalid='ignore'):
+        track = np.degrees(np.arctan2(vx, vy))
+    return np.where(track < 0, track + 360, track)
+
+
+class TrackHistory:
+    def __init__(self, depth=DEPTH, slots=SLOTS):
+        self.depth = depth
+        # callsign -> slot
+        self.slots = {}
+        self.free = []
+
+        # Samples by [slot, ring index], times are NaN where there is no sample
+        self.time = np.empty((0, depth))
+        # x, y and altitude by [slot, quantity, ring index]
+        self.samples = np.empty((0, 3, depth))
+        # Ring index the next sample of each slot is written at
+        self.head = np.empty(0, dtype=int)
+        self.grow(slots)
+        self.estimate()
+
+    # Add slots, keeping the samples already held
+    def grow(self, slots):
+        start = len(self.head)
+        self.time = np.vstack([self.time, np.full((slots, self.depth), np.nan)])
+        self.samples = np.concatenate([self.samples, np.zeros((slots, 3, self.depth))])
+        self.head = np.concatenate([self.head, np.zeros(slots, dtype=int)])
+        self.free.extend(range(start + slots - 1, start - 1, -1))
+
+    def slot(self, callsign):
+        slot = self.slots.get(callsign)
+        if slot is None:
+            if not self.free:
+                self.grow(len(self.head))
+            slot = self.slots[callsign] = self.free.pop()
+        return slot
+
+    # Forget an aircraft and free its slot
+    # Named like dict.pop so the history can be attached to an AircraftStore like any other table
+    def pop(self, callsign, default=None):
+        slot = self.slots.pop(callsign, None)
+        if slot is None:
+            return default
+
+        self.time[slot] = np.nan
+        self.head[slot] = 0
+        self.free.append(slot)
+        return slot
+
+    # Add a sample of every tracked plane, taken at now seconds, and estimate how each is moving
+    def record(self, now, planes):
+        planes = [plane for plane in planes if plane.tracked]
+        if planes:
+            slots = np.array([self.slot(plane.callsign) for plane in planes])
+            head = self.head[slots]
+            self.time[slots, head] = now
+            self.samples[slots, :, head] = [(plane.x, plane.y, plane.alt) for plane in planes]
+            self.head[slots] = (head + 1) % self.depth
+
+        self.estimate()
+
+    def estimate(self):
+        held = ~np.isnan(self.time)
+        count = held.sum(axis=1)
+        # Position of each sample from the oldest held, which is count samples behind the head of the ring
+        rank = (np.arange(self.depth)[None, :] - self.head[:, None]) % self.depth - (self.depth - count)[:, None]
+
+        # Fit every sample, and the older and newer half of them sharing the middle sample if odd
+        masks = np.stack([held, held & (rank < ((count + 1) // 2)[:, None]), held & (rank >= (count // 2)[:, None])])
+        slope, mean_time = slopes(self.time, self.samples, masks)
+        self.vx = slope[0, :, 0]
+        self.vy = slope[0, :, 1]
+        self.climb_rate = slope[0, :, 2]
+        self.ground_speed = np.hypot(self.vx, self.vy) * 3600 / PX_PER_NM
+
+        rows = np.arange(len(count))
+        first = self.samples[rows, :2, (self.head - count) % self.depth]
+        last = self.samples[rows, :2, (self.head - 1) % self.depth]
+        moved = np.hypot(*(last - first).T)
+        self.track = np.where(moved >= MIN_TRACK_DISTANCE, track_angle(self.vx, self.vy), np.nan)
+
+        tracks = track_angle(slope[1:, :, 0], slope[1:, :, 1])
+        turned = (tracks[1] - tracks[0] + 540) % 360 - 180
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.turn_rate = np.where((count >= 3) & ~np.isnan(self.track),
+                                      turned / (mean_time[2] - mean_time[1]), np.nan)
+
+    # Measured track of an aircraft in degrees, or None if it has not been seen moving
+    def measured_track(self, callsign):
+        slot = self.slots.get(callsign)
+        if slot is None or np.isnan(self.track[slot]):
+            return None
+        return float(self.track[slot])
+
+    # Measured ground velocity of an aircraft in px per second, or None if it has not been seen moving
+    def velocity(self, callsign):
+        slot = self.slots.get(callsign)
+        if slot is None or np.isnan(self.track[slot]):
+            return None
+        return float(self.vx[slot]), float(self.vy[slot])
+
+    # Whether an aircraft is visibly turning, and in the direction that brings its track round to heading
+    def turning_towards(self, callsign, heading):
+        slot = self.slots.get(callsign)
+        if slot is None:
+            return False
+
+        track = self.track[slot]
+        turn_rate = self.turn_rate[slot]
+        if np.isnan(track) or np.isnan(turn_rate) or abs(turn_rate) < MIN_TURN_RATE:
+            return False
+
+        remaining = (heading - track + 540) % 360 - 180
+        return remaining * turn_rate > 0
@@ -0,0 +1,110 @@
+import argparse
+import random
+import time
+
+import runner
+from controller import AIRPORT
+from params import Params, search_space, save_params
+
+# Searches for the control constants that play best against the offline simulator
+# The first round draws candidates uniformly from each field's range in params.py, later rounds draw them
+# around the best set so far in a neighbourhood that halves every round. Every candidate plays the same
+# seeds, so the scores differ because of the constants rather than the traffic, and the games of a round
+# are spread over the CPU cores by runner.py
+# A set is tuned for each landing direction, with the wind blowing straight down the runway
+
+# Throughput counts for a candidate and every safety event counts against it
+SCORE_WEIGHTS = {
+    'landings': 1,
+    'handoffs': 1,
+    'go_arounds': -2,
+    'separation_losses': -10,
+    'runway_incursions': -10,
+    'lost': -10,
+}
+WINDS = {'9': 90, '27': 270}
+
+
+def score(totals):
+    return sum(weight * totals[name] for name, weight in SCORE_WEIGHTS.items())
+
+
+# A random Params, anywhere in the search space or, with centre given, normally distributed around it
+# with a standard deviation of scale times each field's range
+def sample(rng, space, centre=None, scale=1.0):
+    values = {}
+    for name, (low, high) in space.items():
+        if centre is None:
+            value = rng.uniform(low, high)
+        else:
+            value = rng.gauss(getattr(centre, name), (high - low) * scale)
+        values[name] = round(min(max(value, low), high), 1)
+    return Params().replace(**values)
+
+
+# Play every candidate on every seed and return the (score, totals) of each candidate
+def evaluate(candidates, seeds, processes, **settings):
+    jobs = [('simulate', dict(settings, params=params, seed=seed)) for params in candidates for seed in seeds]
+    results, _ = runner.run(jobs, processes)
+
+    scores = []
+    for k in range(len(candidates)):
+        games = results[k * len(seeds):(k + 1) * len(seeds)]
+        totals = {name: sum(game[name] for game in games) for name in SCORE_WEIGHTS}
+        scores.append((score(totals), totals))
+    return scores
+
+
+# Returns the best Params found for one landing direction, with its score and totals
+def tune(landing_rwy, rounds, candidates, seeds, rng, processes=None, verbose=True, **settings):
+    settings['wind_dir'] = WINDS[landing_rwy]
+    space = search_space()
+
+    best = Params()
+    best_score, best_totals = evaluate([best], seeds, processes, **settings)[0]
+    if verbose:
+        print('{} defaults: score {} {}'.format(landing_rwy, best_score, best_totals))
+
+    for round_number in range(rounds):
+        if round_number == 0:
+            pool = [sample(rng, space) for _ in range(candidates)]
+        else:
+            pool = [sample(rng, space, best, 0.25 / 2 ** round_number) for _ in range(candidates)]
+
+        for params, (candidate_score, totals) in zip(pool, evaluate(pool, seeds, processes, **settings)):
+            if candidate_score > best_score:
+                best, best_score, best_totals = params, candidate_score, totals
+
+        if verbose:
+            print('{} round {}: best score {} {}'.format(landing_rwy, round_number + 1, best_score, best_totals))
+
+    return best, best_score, best_totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tune the control constants against the offline simulator')
+    parser.add_argument('--runways', nargs='+', default=list(WINDS), choices=list(WINDS),
+                        help='landing directions to tune for')
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--candidates', type=int, default=16, help='parameter sets tried each round')
+    parser.add_argument('--seeds', type=int, default=4, help='games each parameter set plays')
+    parser.add_argument('--minutes', type=float, default=60, help='length of each game')
+    parser.add_argument('--arrivals', type=float, default=30, help='arrivals per hour')
+    parser.add_argument('--departures', type=float, default=30, help='departures per hour')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, default one per core')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the search itself')
+    parser.add_argument('--output', default='tuned_params.json')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    seeds = list(range(1000, 1000 + args.seeds))
+
+    start = time.perf_counter()
+    tuned = {}
+    for landing_rwy in args.runways:
+        best, _, _ = tune(landing_rwy, args.rounds, args.candidates, seeds, rng, args.processes,
+                          minutes=args.minutes, arrival_rate=args.arrivals, departure_rate=args.departures)
+        tuned[AIRPORT, landing_rwy] = best
+
+    save_params(args.output, tuned)
+    print('Tuned in {:.0f}s, written to {}'.format(time.perf_counter() - start, args.output))